@@ -0,0 +1,100 @@
+# Burst test for the admission control in front of the external APIs.
+#
+# Starts a local stand-in for weatherapi.com, points get_temperature at it and
+# fires a burst of concurrent calls. Callers over the rate limit either wait
+# in the bounded queue or fail fast as overloaded, so the latency of every
+# call, admitted or rejected, stays bounded.
+#
+# Usage: python benchmarks/bench_admission.py [--calls 1000] [--rate 50] [--max-wait 1.0]
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.02
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        body = json.dumps({"location": {"name": "Stub"}, "current": {"temp_c": 21.0}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def burst(mcp_server, calls: int):
+    async def one():
+        started = time.perf_counter()
+        try:
+            await mcp_server.mcp.call_tool("get_temperature", {"city": "Stubville"})
+            ok = True
+        except Exception:
+            ok = False
+        return ok, time.perf_counter() - started
+
+    return await asyncio.gather(*(one() for _ in range(calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=50.0, help="allowed upstream requests per second")
+    parser.add_argument("--burst", type=float, default=20.0)
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--max-wait", type=float, default=1.0)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub response time in seconds")
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    os.environ["weatherAPIBaseUrl"] = f"http://127.0.0.1:{server.server_port}"
+    os.environ["WEATHERAPI_RATE"] = str(args.rate)
+    os.environ["WEATHERAPI_BURST"] = str(args.burst)
+    os.environ["WEATHERAPI_MAX_QUEUE"] = str(args.max_queue)
+    os.environ["WEATHERAPI_MAX_WAIT"] = str(args.max_wait)
+    # Measure admission control itself, not the response cache
+    os.environ["WEATHERAPI_CACHE_TTL"] = "0"
+    import mcp_server
+
+    # The tools print every call; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    started = time.perf_counter()
+    results = asyncio.run(burst(mcp_server, args.calls))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    admitted = [latency for ok, latency in results if ok]
+    rejected = [latency for ok, latency in results if not ok]
+    print(f"{args.calls} concurrent calls in {elapsed:.2f}s "
+          f"(rate={args.rate}/s burst={args.burst} max_queue={args.max_queue} max_wait={args.max_wait}s)", file=report)
+    for label, values in (("admitted", admitted), ("overloaded", rejected)):
+        if values:
+            print(f"{label:>10}: {len(values):5d} calls  p50={percentile(values, 0.5) * 1000:7.1f}ms  "
+                  f"p99={percentile(values, 0.99) * 1000:7.1f}ms  max={max(values) * 1000:7.1f}ms", file=report)
+    print(json.dumps(mcp_server.upstreams["weatherapi"].metrics(), indent=2), file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# Benchmark of bulk document ingest.
+#
+# Loads corpora of growing size through the in-process MCP tool dispatcher,
+# once with one document_writer call per document and once with a single
+# import_documents call reading an NDJSON file and a tar archive, and reports
+# documents per second. The extra memory the import needs on top of the
+# documents it stores (peak minus retained, from tracemalloc) should not grow
+# with the corpus.
+#
+# Usage: python benchmarks/bench_bulk_import.py [--counts 1000,10000] [--size 2000]
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import sys
+import tarfile
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+BULK_DIR = tempfile.mkdtemp(prefix="bench-bulk-")
+os.environ["BULK_DIR"] = BULK_DIR
+os.environ.setdefault("WARMUP", "0")
+
+import mcp_server
+
+
+def make_document(i: int, size: int) -> str:
+    line = f"Document {i}: lorem ipsum dolor sit amet, consectetur adipiscing elit.\n"
+    return (line * (size // len(line) + 1))[:size]
+
+
+def write_corpus(count: int, size: int) -> tuple[str, str]:
+    ndjson = os.path.join(BULK_DIR, f"corpus-{count}.ndjson")
+    with open(ndjson, "w", encoding="utf-8") as output:
+        for i in range(count):
+            output.write(json.dumps({"document_name": f"doc-{i}.md", "content": make_document(i, size)}) + "\n")
+    tar = os.path.join(BULK_DIR, f"corpus-{count}.tar")
+    with tarfile.open(tar, "w") as archive:
+        for i in range(count):
+            data = make_document(i, size).encode("utf-8")
+            member = tarfile.TarInfo(f"doc-{i}.md")
+            member.size = len(data)
+            archive.addfile(member, io.BytesIO(data))
+    return os.path.basename(ndjson), os.path.basename(tar)
+
+
+async def write_one_by_one(namespace: str, count: int, size: int) -> None:
+    for i in range(count):
+        await mcp_server.mcp.call_tool("document_writer", {
+            "document_name": f"{namespace}:doc-{i}.md", "content": make_document(i, size),
+        })
+
+
+async def import_file(namespace: str, path: str) -> dict:
+    result = await mcp_server.mcp.call_tool("import_documents", {"path": path, "namespace": namespace})
+    content = result[0] if isinstance(result, tuple) else result
+    return json.loads(content[0].text)
+
+
+def timed(run) -> float:
+    started = time.perf_counter()
+    asyncio.run(run)
+    return time.perf_counter() - started
+
+
+def transient_memory(run) -> int:
+    tracemalloc.start()
+    asyncio.run(run)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak - current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--counts", default="1000,5000,20000")
+    parser.add_argument("--size", type=int, default=2000, help="characters per document")
+    args = parser.parse_args()
+
+    # The tools print progress; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    print(f"{'documents':>10} {'writer docs/s':>14} {'ndjson docs/s':>14} {'tar docs/s':>11} {'ndjson extra mem':>17} {'tar extra mem':>14}",
+          file=report)
+    for count in (int(c) for c in args.counts.split(",")):
+        ndjson, tar = write_corpus(count, args.size)
+        writer = timed(write_one_by_one(f"writer-{count}", count, args.size))
+        for document_name in [name for name in mcp_server.docs.keys() if name.startswith(f"writer-{count}:")]:
+            del mcp_server.docs[document_name]
+        ndjson_time = timed(import_file(f"ndjson-{count}", ndjson))
+        tar_time = timed(import_file(f"tar-{count}", tar))
+        # Import again over the same documents to measure memory without the growth of the store
+        ndjson_memory = transient_memory(import_file(f"ndjson-{count}", ndjson))
+        tar_memory = transient_memory(import_file(f"tar-{count}", tar))
+        print(f"{count:>10} {count / writer:>14.0f} {count / ndjson_time:>14.0f} {count / tar_time:>11.0f} "
+              f"{ndjson_memory / 1e6:>15.2f}MB {tar_memory / 1e6:>12.2f}MB", file=report)
+
+
+if __name__ == "__main__":
+    main()
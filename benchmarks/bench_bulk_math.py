@@ -0,0 +1,71 @@
+# Benchmark of compute_numbers against the per-pair add_numbers call pattern.
+#
+# Sums N numbers three ways through the in-process MCP tool dispatcher:
+# folding them with N - 1 add_numbers calls, one compute_numbers call with the
+# numbers inline, and one compute_numbers call reading them from a CSV document.
+#
+# Usage: python benchmarks/bench_bulk_math.py [--sizes 100,1000,10000]
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mcp_server
+
+
+async def per_pair(values):
+    total = values[0]
+    for value in values[1:]:
+        await mcp_server.mcp.call_tool("add_numbers", {"number1": total, "number2": value})
+        total += value
+    return total
+
+
+async def bulk_inline(values):
+    return await mcp_server.mcp.call_tool("compute_numbers", {"operation": "sum", "values": values})
+
+
+async def bulk_document(values):
+    return await mcp_server.mcp.call_tool(
+        "compute_numbers", {"operation": "sum", "document_name": "bench-values.csv", "column": "value"}
+    )
+
+
+def timed(coroutine_fn, values, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        asyncio.run(coroutine_fn(values))
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    # add_numbers prints every call; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    print(f"{'n':>8} {'add_numbers x (n-1)':>22} {'compute_numbers inline':>24} {'compute_numbers document':>26} {'speedup':>9}",
+          file=report)
+    for size in (int(s) for s in args.sizes.split(",")):
+        values = [random.uniform(-1000, 1000) for _ in range(size)]
+        mcp_server.docs["bench-values.csv"] = "value\n" + "\n".join(repr(v) for v in values)
+        pair = timed(per_pair, values, 1 if size > 1000 else args.repeat)
+        inline = timed(bulk_inline, values, args.repeat)
+        document = timed(bulk_document, values, args.repeat)
+        print(f"{size:>8} {pair * 1000:>20.1f}ms {inline * 1000:>22.2f}ms {document * 1000:>24.2f}ms "
+              f"{pair / inline:>8.0f}x", file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# Benchmark of the compressed document tier.
+#
+# Loads a synthetic text corpus (words drawn from a Zipf-distributed
+# vocabulary, so it compresses roughly like prose) into a DocumentStore with
+# no compression, zlib and lzma, and reports the memory held by the store and
+# the latency of reading hot documents and cold (compressed) documents.
+#
+# Usage: python benchmarks/bench_compression.py [--documents 200] [--size 200000]
+
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from document_store import DocumentStore
+
+
+def make_vocabulary(rng: random.Random, words: int = 5000) -> tuple[list[str], list[float]]:
+    letters = "etaoinshrdlcumwfgypbvkjxqz"
+    vocabulary = ["".join(rng.choices(letters, k=rng.randint(2, 10))) for _ in range(words)]
+    weights = [1.0 / (rank + 1) for rank in range(words)]
+    return vocabulary, weights
+
+
+def make_document(rng: random.Random, vocabulary, weights, size: int) -> str:
+    words = rng.choices(vocabulary, weights, k=size // 6)
+    lines = [" ".join(words[i:i + 12]) for i in range(0, len(words), 12)]
+    return "\n".join(lines)[:size]
+
+
+def percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def run(compression, args) -> dict:
+    rng = random.Random(42)
+    vocabulary, weights = make_vocabulary(rng)
+
+    tracemalloc.start()
+    store = DocumentStore(compression=compression, hot_documents=args.hot)
+    started = time.perf_counter()
+    for i in range(args.documents):
+        store[f"doc-{i}.md"] = make_document(rng, vocabulary, weights, args.size)
+    load_seconds = time.perf_counter() - started
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    names = [f"doc-{i}.md" for i in range(args.documents)]
+    hot_name = names[-1]
+    hot, cold = [], []
+    for _ in range(args.reads):
+        started = time.perf_counter()
+        store[hot_name]
+        hot.append(time.perf_counter() - started)
+        # Reading a random document mostly hits the compressed tier
+        name = rng.choice(names[:-args.hot] or names)
+        started = time.perf_counter()
+        store[name]
+        cold.append(time.perf_counter() - started)
+        store[hot_name]
+    return {
+        "memory": memory,
+        "load": load_seconds,
+        "hot": hot,
+        "cold": cold,
+        "saved": store.memory()["saved_bytes"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--size", type=int, default=200_000, help="characters per document")
+    parser.add_argument("--hot", type=int, default=32, help="hot documents kept uncompressed")
+    parser.add_argument("--reads", type=int, default=500)
+    args = parser.parse_args()
+
+    corpus = args.documents * args.size
+    print(f"corpus: {args.documents} documents, {corpus / 1e6:.1f} MB")
+    print(f"{'compression':>12} {'memory':>10} {'saved':>10} {'load':>8} {'hot p50':>9} {'hot p99':>9} {'cold p50':>9} {'cold p99':>9}")
+    for compression in (None, "zlib", "lzma"):
+        result = run(compression, args)
+        print(f"{compression or 'none':>12} {result['memory'] / 1e6:>8.1f}MB {result['saved'] / 1e6:>8.1f}MB "
+              f"{result['load']:>7.2f}s "
+              f"{percentile(result['hot'], 0.5) * 1e6:>7.1f}us {percentile(result['hot'], 0.99) * 1e6:>7.1f}us "
+              f"{percentile(result['cold'], 0.5) * 1e3:>7.2f}ms {percentile(result['cold'], 0.99) * 1e3:>7.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# Stress test for concurrent document writes.
+#
+# Many threads append to and conditionally edit the same documents through
+# the document_writer tool. At the end every append must be present exactly
+# once and the version must account for every write, i.e. no update was lost.
+#
+# Usage: python benchmarks/bench_concurrent_writes.py [--threads 32] [--writes 200] [--documents 1]
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mcp_server
+from document_store import VersionConflictError
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--writes", type=int, default=200, help="writes per thread")
+    parser.add_argument("--documents", type=int, default=1, help="documents the threads contend on")
+    args = parser.parse_args()
+
+    # The tools print every write; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    names = [f"stress-{i}.md" for i in range(args.documents)]
+    for name in names:
+        mcp_server.docs[name] = ""
+    conflicts = [0] * args.threads
+    start_barrier = threading.Barrier(args.threads)
+
+    def writer(worker: int):
+        start_barrier.wait()
+        for i in range(args.writes):
+            name = names[(worker + i) % len(names)]
+            if i % 2:
+                mcp_server.document_writer(name, f"<{worker}:{i}>")
+                continue
+            # Optimistic compare-and-swap: re-read the version and retry on conflict
+            while True:
+                version = mcp_server.docs.version(name)
+                try:
+                    mcp_server.document_writer(name, f"<{worker}:{i}>", expected_version=version)
+                    break
+                except VersionConflictError:
+                    conflicts[worker] += 1
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(args.threads)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    total = args.threads * args.writes
+    combined = "".join(mcp_server.docs[name] for name in names)
+    missing = [
+        (w, i) for w in range(args.threads) for i in range(args.writes)
+        if combined.count(f"<{w}:{i}>") != 1
+    ]
+    versions = sum(mcp_server.docs.version(name) for name in names)
+    # Each document starts at version 1 after being created empty
+    expected_versions = total + len(names)
+
+    print(f"threads={args.threads} writes/thread={args.writes} documents={len(names)}", file=report)
+    print(f"throughput: {total / elapsed:,.0f} writes/s ({elapsed:.3f}s)", file=report)
+    print(f"compare-and-swap retries: {sum(conflicts)}", file=report)
+    print(f"versions: {versions} (expected {expected_versions})", file=report)
+    if missing or versions != expected_versions:
+        print(f"LOST UPDATES: {len(missing)} writes missing or duplicated", file=report)
+        sys.exit(1)
+    print("no lost updates", file=report)
+
+
+if __name__ == "__main__":
+    main()
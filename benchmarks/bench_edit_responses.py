@@ -0,0 +1,71 @@
+# Benchmark of document_editor responses by document size.
+#
+# Makes a one-line edit in the middle of documents of growing size through
+# the in-process MCP tool dispatcher, with response_mode="summary" and
+# response_mode="full", and reports the round-trip time including JSON-RPC
+# serialization of the result and the bytes that would go over the wire.
+#
+# Usage: python benchmarks/bench_edit_responses.py [--sizes 1000,100000,5000000]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mcp.types import CallToolResult
+
+import mcp_server
+
+
+def make_document(size: int) -> str:
+    line = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.\n"
+    lines = [line] * max(1, size // len(line))
+    lines[len(lines) // 2] = "MARKER line in the middle of the document.\n"
+    return "".join(lines)
+
+
+async def edit(document_name: str, response_mode: str, flip: bool) -> int:
+    old, new = ("MARKER", "marker") if flip else ("marker", "MARKER")
+    result = await mcp_server.mcp.call_tool("document_editor", {
+        "document_name": document_name, "old_content": old, "new_content": new, "response_mode": response_mode,
+    })
+    content, structured = result if isinstance(result, tuple) else (result, None)
+    payload = CallToolResult(content=content, structuredContent=structured).model_dump_json(by_alias=True, exclude_none=True)
+    return len(payload.encode("utf-8"))
+
+
+async def measure(document_name: str, response_mode: str, repeat: int) -> tuple[float, int]:
+    best, size = float("inf"), 0
+    for i in range(repeat):
+        started = time.perf_counter()
+        size = await edit(document_name, response_mode, flip=i % 2 == 0)
+        best = min(best, time.perf_counter() - started)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="1000,100000,1000000,5000000")
+    parser.add_argument("--repeat", type=int, default=6)
+    args = parser.parse_args()
+
+    # The tools print progress; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    print(f"{'document':>10} {'summary time':>13} {'summary bytes':>14} {'full time':>11} {'full bytes':>12} {'bytes saved':>12}",
+          file=report)
+    for size in (int(s) for s in args.sizes.split(",")):
+        document_name = f"bench-{size}.md"
+        mcp_server.docs[document_name] = make_document(size)
+        summary_time, summary_bytes = asyncio.run(measure(document_name, "summary", args.repeat))
+        full_time, full_bytes = asyncio.run(measure(document_name, "full", args.repeat))
+        print(f"{size:>10} {summary_time * 1000:>11.2f}ms {summary_bytes:>14} {full_time * 1000:>9.2f}ms {full_bytes:>12} "
+              f"{full_bytes / summary_bytes:>11.0f}x", file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+# Offline benchmark of the network tools against the record/replay stand-in.
+#
+# Without --fixtures a synthetic fixture file is generated, so this runs on a
+# machine with no network. Reports per-call latency for get_temperature,
+# get_currency_exchange_rates and get_stock_price sequentially and under
+# concurrency, with the response cache off (every call reaches the stand-in)
+# and on.
+#
+# Usage: python benchmarks/bench_network_tools.py [--calls 200] [--concurrency 20]
+#            [--latency 0.02] [--error-rate 0.0] [--fixtures fixtures/upstreams.json]
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from upstream_replay import FixtureStore
+
+CITIES = ["London", "Paris", "Tokyo", "Delhi", "Lima"]
+CURRENCIES = ["USD", "EUR", "JPY", "INR", "GBP"]
+TICKERS = ["AAPL", "MSFT", "GOOG", "AMZN", "NVDA"]
+
+
+def write_synthetic_fixtures(path: str) -> None:
+    fixtures = FixtureStore(path)
+    for city in CITIES:
+        fixtures.put("weatherapi", f"/current.json?q={city}", 200,
+                     {"location": {"name": city}, "current": {"temp_c": 20.0, "condition": {"text": "Sunny"}}})
+    for currency in CURRENCIES:
+        fixtures.put("exchangerate", f"/latest/{currency}/", 200,
+                     {"result": "success", "base_code": currency,
+                      "conversion_rates": {c: 1.0 for c in CURRENCIES}})
+    for ticker in TICKERS:
+        fixtures.put("yahoo", f"/{ticker}", 200, {"price": "123.45"})
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+
+async def run(mcp_server, name: str, arguments: list[dict], concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async def one(args):
+        nonlocal errors
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await mcp_server.mcp.call_tool(name, args)
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(args) for args in arguments))
+    return latencies, errors, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200, help="calls per tool and scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", default="0.02", help='injected stand-in latency, e.g. "0.02" or "0.01-0.1"')
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="recorded fixture file (default: synthetic)")
+    args = parser.parse_args()
+
+    fixtures = args.fixtures
+    if not fixtures:
+        fixtures = os.path.join(tempfile.mkdtemp(), "upstreams.json")
+        write_synthetic_fixtures(fixtures)
+
+    os.environ.update(UPSTREAM_MODE="replay", UPSTREAM_FIXTURES=fixtures,
+                      REPLAY_LATENCY=args.latency, REPLAY_ERROR_RATE=str(args.error_rate))
+    # Admission control is measured by bench_admission.py; keep it out of the way here
+    for upstream in ("WEATHERAPI", "EXCHANGERATE", "YAHOO"):
+        os.environ[f"{upstream}_RATE"] = "1000000"
+        os.environ[f"{upstream}_BURST"] = "1000000"
+    import mcp_server
+
+    # The tools print every call; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    tools = {
+        "get_temperature": [{"city": CITIES[i % len(CITIES)]} for i in range(args.calls)],
+        "get_currency_exchange_rates": [{"currency": CURRENCIES[i % len(CURRENCIES)]} for i in range(args.calls)],
+        "get_stock_price": [{"ticker": TICKERS[i % len(TICKERS)]} for i in range(args.calls)],
+    }
+    print(f"stand-in latency={args.latency}s error_rate={args.error_rate} calls={args.calls}", file=report)
+    for cache_ttl in (0.0, 300.0):
+        for upstream in mcp_server.upstreams.values():
+            upstream.cache.clear()
+            upstream.cache_ttl = cache_ttl
+        for concurrency in (1, args.concurrency):
+            for name, arguments in tools.items():
+                latencies, errors, elapsed = asyncio.run(run(mcp_server, name, arguments, concurrency))
+                print(f"cache={'on ' if cache_ttl else 'off'} concurrency={concurrency:3d} {name:28s} "
+                      f"{len(latencies) / elapsed:8.0f} calls/s  p50={percentile(latencies, 0.5) * 1000:6.2f}ms  "
+                      f"p99={percentile(latencies, 0.99) * 1000:6.2f}ms  errors={errors}", file=report)
+    stand_in = mcp_server.replay.server
+    print(f"stand-in requests={stand_in.requests} injected_errors={stand_in.injected_errors} "
+          f"misses={stand_in.misses}", file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# Benchmark of the server's worker mode (SERVER_WORKERS) from 1 to N processes.
+#
+# Stores CSV documents, then measures the throughput of concurrent
+# compute_numbers calls that parse a column of a document, and of
+# grep_documents over the whole corpus, through the in-process MCP tool
+# dispatcher. The first row runs everything in the server process as without
+# SERVER_WORKERS; the others use 1, 2, ... worker processes. Each worker run
+# starts with a pass that sends the documents to the workers, which is timed
+# separately ("first pass") from the passes that find them already there.
+#
+# Throughput can only grow with workers up to the number of free cores.
+#
+# Usage: python benchmarks/bench_workers.py [--workers 1,2,4] [--documents 32] [--rows 20000]
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("WARMUP", "0")
+
+import mcp_server
+from worker_pool import ShardedWorkers
+
+
+def make_document(i: int, rows: int) -> str:
+    return "id,value,weight\n" + "".join(f"{j},{(j * 7919 + i) % 10007 / 7.0},{j % 13}\n" for j in range(rows))
+
+
+async def compute_pass(names: list[str], calls: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await mcp_server.mcp.call_tool("compute_numbers", {
+                "operation": "describe", "document_name": names[i % len(names)], "column": "value",
+            })
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return time.perf_counter() - started
+
+
+async def grep_pass(searches: int) -> float:
+    started = time.perf_counter()
+    for _ in range(searches):
+        await mcp_server.mcp.call_tool("grep_documents", {"pattern": r"^\d+,1000\.\d+,", "max_matches": 100000})
+    return time.perf_counter() - started
+
+
+async def run(workers: int, names: list[str], calls: int, concurrency: int, searches: int) -> tuple[float, float, float]:
+    mcp_server.workers = ShardedWorkers(workers) if workers else None
+    try:
+        if mcp_server.workers is not None:
+            await mcp_server.workers.start()
+        first = await compute_pass(names, len(names), concurrency)
+        await grep_pass(1)
+        compute = await compute_pass(names, calls, concurrency)
+        grep = await grep_pass(searches)
+        return first, calls / compute, searches / grep
+    finally:
+        if mcp_server.workers is not None:
+            mcp_server.workers.close()
+        mcp_server.workers = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, os.cpu_count() or 1})))
+    parser.add_argument("--documents", type=int, default=32)
+    parser.add_argument("--rows", type=int, default=20000, help="CSV rows per document")
+    parser.add_argument("--calls", type=int, default=128, help="compute_numbers calls per measurement")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--searches", type=int, default=5, help="grep_documents calls per measurement")
+    args = parser.parse_args()
+
+    # The tools print progress; keep the benchmark output readable
+    sys.stdout = open(os.devnull, "w")
+    report = sys.__stdout__
+
+    names = [f"bench-workers/data-{i}.csv" for i in range(args.documents)]
+    for i, name in enumerate(names):
+        mcp_server.docs[name] = make_document(i, args.rows)
+    megabytes = sum(len(mcp_server.docs[name]) for name in names) / 1e6
+    print(f"{args.documents} documents, {megabytes:.1f} MB, {os.cpu_count()} CPUs", file=report)
+
+    print(f"{'workers':>8} {'first pass s':>13} {'compute calls/s':>16} {'speedup':>8} {'greps/s':>8} {'speedup':>8}", file=report)
+    baseline = None
+    for workers in [0] + [int(n) for n in args.workers.split(",")]:
+        first, compute, grep = asyncio.run(run(workers, names, args.calls, args.concurrency, args.searches))
+        baseline = baseline or (compute, grep)
+        label = str(workers) if workers else "none"
+        print(f"{label:>8} {first:>13.2f} {compute:>16.1f} {compute / baseline[0]:>7.2f}x {grep:>8.2f} {grep / baseline[1]:>7.2f}x",
+              file=report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+# Vectorized arithmetic over arrays of numbers for the compute_numbers tool.
+#
+# Numbers come inline or from a document holding CSV or whitespace/comma
+# separated values, and every operation runs as a single NumPy pass.
+
+import csv
+import io
+
+import numpy as np
+
+REDUCTIONS = ("sum", "mean", "min", "max", "std", "count", "percentiles", "describe")
+ELEMENTWISE = ("add", "subtract", "multiply", "divide", "power")
+BINARY_REDUCTIONS = ("dot",)
+OPERATIONS = REDUCTIONS + ELEMENTWISE + BINARY_REDUCTIONS
+
+
+def parse_numbers(text: str, column: str | None = None) -> np.ndarray:
+    """Parses numbers from document text.
+
+    With `column`, the text is read as CSV and that column is used; it can
+    be a header name or a zero-based index. Without it, every value in the
+    text separated by commas, semicolons or whitespace must be a number.
+    """
+    if column is None:
+        values = np.array(text.replace(",", " ").replace(";", " ").split(), dtype=np.float64)
+        return values
+
+    reader = csv.reader(io.StringIO(text))
+    rows = [row for row in reader if row]
+    if not rows:
+        return np.empty(0)
+    if column.isdigit():
+        index, data = int(column), rows
+        try:
+            float(rows[0][index])
+        except (ValueError, IndexError):
+            # First row is a header
+            data = rows[1:]
+    else:
+        header = [name.strip() for name in rows[0]]
+        if column not in header:
+            raise ValueError(f"Column {column} not found. Available columns: {', '.join(header)}")
+        index, data = header.index(column), rows[1:]
+    try:
+        return np.array([row[index] for row in data], dtype=np.float64)
+    except (ValueError, IndexError):
+        raise ValueError(f"Column {column} does not hold numbers in every row.")
+
+
+def compute_text(text: str, operation: str, column: str | None = None, other=None,
+                 other_column: str | None = None, percentiles: list[float] | None = None) -> dict:
+    """Parses the numbers of a document and runs one operation over them.
+
+    `other_column` reads the second operand from another column of the same text.
+    """
+    values = parse_numbers(text, column)
+    if other_column is not None:
+        other = parse_numbers(text, other_column)
+    return compute(operation, values, other, percentiles)
+
+
+def _finite(operation: str, result):
+    """Returns a reduction's result as float(s), or raises ValueError if it overflowed or met NaN."""
+    result = np.asarray(result, dtype=np.float64)
+    if not np.isfinite(result).all():
+        raise ValueError(f"Operation {operation} has no finite result: the numbers overflow or include NaN or infinity.")
+    return float(result) if result.ndim == 0 else result
+
+
+def compute(operation: str, values: np.ndarray, other: np.ndarray | float | None = None,
+            percentiles: list[float] | None = None) -> dict:
+    """Runs one operation over `values` and returns a JSON-ready result."""
+    if operation not in OPERATIONS:
+        raise ValueError(f"Unknown operation {operation}. Use one of: {', '.join(OPERATIONS)}")
+    if operation in ELEMENTWISE + BINARY_REDUCTIONS:
+        if other is None:
+            raise ValueError(f"Operation {operation} needs a second operand.")
+        other = np.asarray(other, dtype=np.float64)
+        if operation in BINARY_REDUCTIONS and other.ndim == 0:
+            raise ValueError(f"Operation {operation} needs a list of numbers as second operand, not a single number.")
+        if other.ndim and other.shape != values.shape:
+            raise ValueError(f"Operands have different lengths: {values.size} and {other.size}.")
+    elif values.size == 0 and operation != "count":
+        raise ValueError("No numbers to compute on.")
+
+    # Overflow and NaN input surface as non-finite results, which _finite rejects
+    with np.errstate(over="ignore", invalid="ignore"):
+        if operation == "sum":
+            return {"operation": operation, "result": _finite(operation, values.sum())}
+        if operation == "mean":
+            return {"operation": operation, "result": _finite(operation, values.mean())}
+        if operation == "min":
+            return {"operation": operation, "result": _finite(operation, values.min())}
+        if operation == "max":
+            return {"operation": operation, "result": _finite(operation, values.max())}
+        if operation == "std":
+            return {"operation": operation, "result": _finite(operation, values.std(ddof=1)) if values.size > 1 else 0.0}
+        if operation == "count":
+            return {"operation": operation, "result": int(values.size)}
+        if operation == "percentiles":
+            points = percentiles or [50.0]
+            return {"operation": operation, "result": dict(zip((str(p) for p in points), _finite(operation, np.percentile(values, points)).tolist()))}
+        if operation == "describe":
+            points = percentiles or [25.0, 50.0, 75.0]
+            return {
+                "operation": operation,
+                "result": {
+                    "count": int(values.size),
+                    "sum": _finite(operation, values.sum()),
+                    "mean": _finite(operation, values.mean()),
+                    "std": _finite(operation, values.std(ddof=1)) if values.size > 1 else 0.0,
+                    "min": _finite(operation, values.min()),
+                    "max": _finite(operation, values.max()),
+                    "percentiles": dict(zip((str(p) for p in points), _finite(operation, np.percentile(values, points)).tolist())),
+                },
+            }
+        if operation == "dot":
+            return {"operation": operation, "result": _finite(operation, np.dot(values, other))}
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = {
+            "add": np.add,
+            "subtract": np.subtract,
+            "multiply": np.multiply,
+            "divide": np.divide,
+            "power": np.power,
+        }[operation](values, other)
+    # JSON has no NaN or infinity
+    return {"operation": operation, "count": int(result.size), "result": np.where(np.isfinite(result), result, None).tolist()}
@@ -0,0 +1,154 @@
+# Background execution of main.py commands for the Streamlit app.
+#
+# Streamlit reruns its script on every interaction, so a command run inline
+# freezes the page until it finishes. Here each command is a CommandJob run
+# by a bounded pool of worker threads shared by all sessions (module state
+# survives reruns). The job's process output is collected as it arrives, so
+# the page can poll the job for its status and partial output, and cancel it.
+
+import itertools
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from tracing import tracer
+
+ACTIVE = ("queued", "running")
+
+_ids = itertools.count(1)
+
+
+class CommandJob:
+    """One main.py command, from submission until its process exits."""
+
+    def __init__(self, command: str, timeout: float):
+        self.id = next(_ids)
+        self.command = command
+        self.timeout = timeout
+        self.status = "queued"
+        self.error = ""
+        self.returncode = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self._chunks = []
+        self._lock = threading.Lock()
+        self._process = None
+        self._cancelled = False
+        self._timed_out = False
+
+    @property
+    def active(self) -> bool:
+        return self.status in ACTIVE
+
+    @property
+    def output(self) -> str:
+        """The output printed so far."""
+        with self._lock:
+            return "".join(self._chunks)
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.time()) - self.started
+
+    def result(self) -> str:
+        """The text to keep in the history once the job has finished."""
+        if self.status == "done":
+            return self.output
+        if self.status == "failed":
+            return f"Error: {self.error}"
+        if self.status == "timed out":
+            return f"Execution error: timed out after {self.timeout:g} seconds\n{self.output}"
+        return f"Cancelled after {self.elapsed:.1f} seconds\n{self.output}"
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            process = self._process
+            if self.status == "queued":
+                # Still waiting for a worker, which will skip it
+                self.status, self.finished = "cancelled", time.time()
+        if process is not None:
+            process.terminate()
+
+    def _expire(self) -> None:
+        self._timed_out = True
+        with self._lock:
+            process = self._process
+        if process is not None:
+            process.kill()
+
+    def run(self) -> None:
+        try:
+            self._run()
+        except Exception as e:
+            # A job must always finish, or the page would poll it forever
+            with self._lock:
+                process = self._process
+            if process is not None and process.poll() is None:
+                process.kill()
+            self.status, self.error, self.finished = "failed", f"{type(e).__name__}: {e}", time.time()
+
+    def _run(self) -> None:
+        with self._lock:
+            if self._cancelled:
+                return
+            self.status, self.started = "running", time.time()
+        with tracer.span("streamlit command", command=self.command), tempfile.TemporaryFile() as stderr:
+            # Unbuffered, so output reaches the page while the command runs, and in the encoding read here
+            env = dict(tracer.child_env() or os.environ, PYTHONUNBUFFERED="1", PYTHONIOENCODING="utf-8")
+            try:
+                with self._lock:
+                    if self._cancelled:
+                        self.status, self.finished = "cancelled", time.time()
+                        return
+                    self._process = subprocess.Popen(
+                        [sys.executable, "main.py", self.command],
+                        stdout=subprocess.PIPE, stderr=stderr, encoding="utf-8", errors="replace", env=env,
+                        cwd=os.path.dirname(os.path.abspath(__file__)),
+                    )
+            except OSError as e:
+                self.status, self.error, self.finished = "failed", str(e), time.time()
+                return
+            timer = threading.Timer(self.timeout, self._expire)
+            timer.daemon = True
+            timer.start()
+            try:
+                for line in self._process.stdout:
+                    with self._lock:
+                        self._chunks.append(line)
+                self.returncode = self._process.wait()
+            finally:
+                timer.cancel()
+            if self._cancelled:
+                self.status = "cancelled"
+            elif self._timed_out:
+                self.status = "timed out"
+            elif self.returncode == 0:
+                self.status = "done"
+            else:
+                stderr.seek(0)
+                self.status, self.error = "failed", stderr.read().decode("utf-8", "replace")
+            self.finished = time.time()
+
+
+class JobPool:
+    """Runs CommandJobs on at most `max_workers` threads; the rest wait in the queue."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="command-job")
+
+    def submit(self, command: str, timeout: float = 30.0) -> CommandJob:
+        job = CommandJob(command, timeout)
+        self._executor.submit(job.run)
+        return job
+
+
+pool = JobPool(int(os.getenv('JOB_WORKERS', '4')))
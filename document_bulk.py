@@ -0,0 +1,111 @@
+# Bulk import and export of documents for the import_documents and
+# export_documents tools.
+#
+# Both directions stream: NDJSON is read and written one line per document
+# and tar archives one member at a time (tarfile's "r|*" / "w|" stream modes),
+# so only the document being processed is held in memory, whatever the size
+# of the corpus.
+#
+# NDJSON records look like {"document_name": "plan.md", "content": "..."};
+# export adds the document's "version". In a tar archive the member path is
+# the document name.
+
+import io
+import json
+import tarfile
+
+FORMATS = ("ndjson", "tar")
+IMPORT_MODES = ("replace", "append", "create")
+
+
+def detect_format(path: str | None, format: str | None) -> str:
+    """Returns the given format, or guesses it from the file extension (NDJSON by default)."""
+    if format is not None:
+        if format not in FORMATS:
+            raise ValueError(f"Unknown format {format}. Use one of: {', '.join(FORMATS)}")
+        return format
+    if path and (".tar" in path.lower() or path.lower().endswith((".tgz", ".tbz2", ".txz"))):
+        return "tar"
+    return "ndjson"
+
+
+def read_ndjson(lines):
+    """Yields (item, document_name, content, error) for each non-empty line of NDJSON text or bytes."""
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            document_name, content = record["document_name"], record["content"]
+        except (ValueError, KeyError, TypeError) as e:
+            yield f"line {number}", None, None, f"Invalid record: {e!r}"
+            continue
+        if not isinstance(document_name, str) or not document_name or not isinstance(content, str):
+            yield f"line {number}", None, None, "Invalid record: document_name and content must be strings"
+            continue
+        yield f"line {number}", document_name, content, None
+
+
+def read_tar(fileobj):
+    """Yields (item, document_name, content, error) for each regular file in a tar stream."""
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            # TarFile remembers every member it has read, even in stream mode
+            archive.members = []
+            if not member.isfile():
+                continue
+            data = archive.extractfile(member).read()
+            try:
+                yield member.name, member.name, data.decode("utf-8"), None
+            except UnicodeDecodeError as e:
+                yield member.name, member.name, None, f"Not UTF-8 text: {e}"
+
+
+def import_document(docs, document_name: str, content: str, mode: str) -> dict:
+    """Writes one document and returns its status; raises ValueError if it is rejected."""
+    def change(previous: str | None) -> str:
+        if previous is None:
+            return content
+        if mode == "create":
+            raise ValueError(f"Document {document_name} already exists.")
+        return previous + content if mode == "append" else content
+
+    previous, text, version = docs.modify(document_name, change)
+    return {
+        "document_name": document_name,
+        "status": "created" if previous is None else "updated",
+        "version": version,
+        "length": len(text),
+    }
+
+
+def read_document(docs, document_name: str) -> tuple[str, int]:
+    """Returns a document's text and version without making it hot (see DocumentStore.peek)."""
+    while True:
+        version = docs.version(document_name)
+        text = docs.peek(document_name)
+        if docs.version(document_name) == version:
+            return text, version
+
+
+def ndjson_record(document_name: str, text: str, version: int) -> bytes:
+    return json.dumps({"document_name": document_name, "version": version, "content": text},
+                      ensure_ascii=False).encode("utf-8", "surrogatepass") + b"\n"
+
+
+class TarWriter:
+    """Appends documents to a tar stream, compressed when the path ends in .gz, .bz2 or .xz."""
+
+    def __init__(self, fileobj, path: str = ""):
+        compression = next((c for c in ("gz", "bz2", "xz") if path.endswith(("." + c, ".t" + c))), "")
+        self._archive = tarfile.open(fileobj=fileobj, mode=f"w|{compression}", format=tarfile.PAX_FORMAT)
+
+    def add(self, document_name: str, text: str, version: int) -> None:
+        data = text.encode("utf-8", "surrogatepass")
+        member = tarfile.TarInfo(document_name)
+        member.size = len(data)
+        member.pax_headers = {"document_version": str(version)}
+        self._archive.addfile(member, io.BytesIO(data))
+
+    def close(self) -> None:
+        self._archive.close()
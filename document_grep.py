@@ -0,0 +1,183 @@
+# Regular expression search across the documents for the grep_documents tool.
+#
+# The pattern is compiled once per process. Documents are read in batches as
+# the scan goes, so a large corpus is never held in memory at once. Small
+# corpora are scanned in one worker thread; larger ones batch by batch in a
+# process pool, and each batch's matches are handed back as soon as it
+# finishes so the tool can stream them to the client. In the server's
+# worker mode the documents are scanned by the worker that holds them instead.
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+MAX_LINE_CHARS = 200
+MAX_MATCH_CHARS = 200
+
+
+@functools.lru_cache(maxsize=32)
+def compile_pattern(pattern: str, ignore_case: bool = False) -> re.Pattern:
+    """Compiles a pattern, raising ValueError for invalid ones."""
+    try:
+        return re.compile(pattern, re.MULTILINE | (re.IGNORECASE if ignore_case else 0))
+    except re.error as e:
+        raise ValueError(f"Invalid pattern {pattern!r}: {e}")
+
+
+def grep_text(regex: re.Pattern, document_name: str, text: str, max_matches: int) -> list[dict]:
+    """Returns up to `max_matches` matches in one text with their line, column and offset."""
+    matches = []
+    line, line_start, counted_to = 1, 0, 0
+    for match in regex.finditer(text):
+        start = match.start()
+        # Count line breaks incrementally from the previous match
+        newlines = text.count("\n", counted_to, start)
+        if newlines:
+            line += newlines
+            line_start = text.rfind("\n", counted_to, start) + 1
+        counted_to = start
+        line_end = text.find("\n", start)
+        line_text = text[line_start:line_end if line_end != -1 else len(text)]
+        matches.append({
+            "document_name": document_name,
+            "line": line,
+            "column": start - line_start + 1,
+            "offset": start,
+            "match": match.group()[:MAX_MATCH_CHARS],
+            "line_text": line_text[:MAX_LINE_CHARS],
+        })
+        if len(matches) >= max_matches:
+            break
+    return matches
+
+
+def grep_batch(pattern: str, ignore_case: bool, documents: list[tuple[str, str]], max_matches: int) -> list[dict]:
+    """Scans a batch of (name, text) documents; runs in the worker processes."""
+    regex = compile_pattern(pattern, ignore_case)
+    matches = []
+    for name, text in documents:
+        matches.extend(grep_text(regex, name, text, max_matches - len(matches)))
+        if len(matches) >= max_matches:
+            break
+    return matches
+
+
+class ParallelGrep:
+    """Scans documents for a pattern, in a process pool once there is enough text."""
+
+    def __init__(self, max_workers: int | None = None, parallel_min_bytes: int = 4 * 1024 * 1024,
+                 batch_bytes: int = 1024 * 1024):
+        self.max_workers = max_workers
+        self.parallel_min_bytes = parallel_min_bytes
+        self.batch_bytes = batch_bytes
+        self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forked workers can deadlock on locks held by the server's threads (e.g. its
+            # stdin reader), so start them from a clean fork server instead
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.max_workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context("forkserver"),
+            )
+        return self._pool
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+    def read_batch(self, names, read, max_bytes: int) -> list[tuple[str, str]]:
+        """Reads documents from the iterator `names` until their texts reach `max_bytes`."""
+        batch, size = [], 0
+        for name in names:
+            text = read(name)
+            batch.append((name, text))
+            size += len(text)
+            if size >= max_bytes:
+                break
+        return batch
+
+    def batches(self, documents) -> list[list[tuple[str, str]]]:
+        batches, batch, size = [], [], 0
+        for name, text in documents:
+            batch.append((name, text))
+            size += len(text)
+            if size >= self.batch_bytes:
+                batches.append(batch)
+                batch, size = [], 0
+        if batch:
+            batches.append(batch)
+        return batches
+
+    async def search(self, pattern: str, names, read, ignore_case: bool = False, max_matches: int = 100):
+        """Yields (documents_done, matches) per finished batch until `max_matches` are found.
+
+        `read(name)` returns a document's text. Documents are read in batches
+        as the scan needs them, so only a few batches are in memory at once.
+        """
+        compile_pattern(pattern, ignore_case)
+        names = iter(names)
+        # Reading documents can mean decompressing or extracting them
+        first = await asyncio.to_thread(self.read_batch, names, read, self.parallel_min_bytes)
+        if sum(len(text) for _, text in first) < self.parallel_min_bytes:
+            # That was the whole corpus, and too little to be worth the process pool
+            matches = await asyncio.to_thread(grep_batch, pattern, ignore_case, first, max_matches)
+            yield len(first), matches
+            return
+
+        pool = self._executor()
+        pending = deque(self.batches(first))
+        # Batches submitted at once; the next one is read while these are scanned
+        max_in_flight = 2 * (self.max_workers or os.cpu_count())
+        futures = {}
+        done, found, exhausted = 0, 0, False
+        try:
+            while True:
+                while len(futures) < max_in_flight:
+                    if not pending and not exhausted:
+                        batch = await asyncio.to_thread(self.read_batch, names, read, self.batch_bytes)
+                        if batch:
+                            pending.append(batch)
+                        else:
+                            exhausted = True
+                    if not pending:
+                        break
+                    batch = pending.popleft()
+                    futures[asyncio.wrap_future(pool.submit(grep_batch, pattern, ignore_case, batch, max_matches))] = len(batch)
+                if not futures:
+                    return
+                finished, _ = await asyncio.wait(futures, return_when=asyncio.FIRST_COMPLETED)
+                for future in finished:
+                    done += futures.pop(future)
+                    matches = future.result()[:max_matches - found]
+                    found += len(matches)
+                    yield done, matches
+                    if found >= max_matches:
+                        return
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def search_workers(self, workers, pattern: str, names: list[str], read, ignore_case: bool = False,
+                             max_matches: int = 100):
+        """Like search, but each of the server's worker processes (see worker_pool) scans its shard.
+
+        The workers keep the texts they were sent, so `read(name)` is only
+        called for documents a worker does not hold yet.
+        """
+        compile_pattern(pattern, ignore_case)
+        found = 0
+        async for done, matches in workers.map_documents(
+            names, read, functools.partial(grep_batch, pattern, ignore_case), max_matches, batch_bytes=self.batch_bytes
+        ):
+            matches = matches[:max_matches - found]
+            found += len(matches)
+            yield done, matches
+            if found >= max_matches:
+                return
+
@@ -0,0 +1,304 @@
+# Version history for documents edited through the MCP tools.
+#
+# Every version is stored either as a full snapshot or as a compact delta
+# against the version right before it. A new snapshot is taken every
+# `snapshot_interval` versions (or whenever a delta would not be smaller than
+# the text itself), so rebuilding any version only replays the deltas between
+# it and the nearest earlier snapshot.
+
+import difflib
+import threading
+import time
+from collections import deque
+
+# A delta is a list of operations applied to the previous version's text:
+#   (start, end) -> copy previous_text[start:end]
+#   "some text"  -> insert the literal text
+COPY_OP_BYTES = 16
+
+
+def _common_prefix_length(a: str, b: str) -> int:
+    # Binary search with slice comparisons, which run at C speed
+    lo, hi = 0, min(len(a), len(b))
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[:mid] == b[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    lo, hi = 0, limit
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return lo
+
+
+def changed_region(old: str, new: str) -> tuple[int, int, int]:
+    """Returns (start, old_end, new_end): `old[start:old_end]` became `new[start:new_end]`.
+
+    The region is everything between the common prefix and suffix, so
+    several separate changes are reported as one region spanning them.
+    """
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    return prefix, len(old) - suffix, len(new) - suffix
+
+
+def make_delta(old: str, new: str) -> list:
+    """Builds a delta that turns `old` into `new`."""
+    # Trim the common prefix / suffix first so appends and small in-place
+    # edits stay cheap even on documents that are a single long line.
+    prefix, old_end, new_end = changed_region(old, new)
+
+    ops = []
+    if prefix:
+        ops.append((0, prefix))
+
+    old_mid = old[prefix:old_end]
+    new_mid = new[prefix:new_end]
+    if old_mid and new_mid and "\n" in old_mid and "\n" in new_mid:
+        old_lines = old_mid.splitlines(keepends=True)
+        new_lines = new_mid.splitlines(keepends=True)
+        offsets = [prefix]
+        for line in old_lines:
+            offsets.append(offsets[-1] + len(line))
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                ops.append((offsets[i1], offsets[i2]))
+            elif j2 > j1:
+                ops.append("".join(new_lines[j1:j2]))
+    elif new_mid:
+        ops.append(new_mid)
+
+    if old_end < len(old):
+        ops.append((old_end, len(old)))
+    return ops
+
+
+def apply_delta(old: str, delta: list) -> str:
+    """Applies a delta produced by `make_delta` to `old`."""
+    return "".join(old[op[0]:op[1]] if isinstance(op, tuple) else op for op in delta)
+
+
+def delta_size(delta: list) -> int:
+    """Approximate number of bytes a delta occupies."""
+    return sum(COPY_OP_BYTES if isinstance(op, tuple) else len(op.encode("utf-8")) for op in delta)
+
+
+class _Version:
+    __slots__ = ("version", "timestamp", "snapshot", "delta", "size")
+
+    def __init__(self, version, timestamp, snapshot=None, delta=None):
+        self.version = version
+        self.timestamp = timestamp
+        self.snapshot = snapshot
+        self.delta = delta
+        if snapshot is not None:
+            self.size = len(snapshot.encode("utf-8"))
+        else:
+            self.size = delta_size(delta)
+
+    @property
+    def kind(self) -> str:
+        return "snapshot" if self.snapshot is not None else "delta"
+
+
+class _VersionChain:
+    """Versions of a single document, oldest first."""
+
+    def __init__(self):
+        self.entries = deque()
+        # Cached text of the newest version; None after `release`
+        self.latest_text = None
+        self.since_snapshot = 0
+
+    def index_of(self, version: int) -> int:
+        if not self.entries:
+            raise ValueError("No versions recorded.")
+        # Version numbers are increasing but may have gaps once old versions
+        # are pruned or the caller supplies its own numbers.
+        lo, hi = 0, len(self.entries) - 1
+        while lo <= hi:
+            mid = (lo + hi) // 2
+            found = self.entries[mid].version
+            if found == version:
+                return mid
+            if found < version:
+                lo = mid + 1
+            else:
+                hi = mid - 1
+        raise ValueError(f"Version {version} not found.")
+
+    def text_at(self, index: int) -> str:
+        if index == len(self.entries) - 1 and self.latest_text is not None:
+            return self.latest_text
+        start = index
+        while self.entries[start].snapshot is None:
+            start -= 1
+        text = self.entries[start].snapshot
+        for i in range(start + 1, index + 1):
+            text = apply_delta(text, self.entries[i].delta)
+        return text
+
+
+class DocumentHistory:
+    """Keeps bounded per-document version history as snapshots plus deltas.
+
+    Retention is enforced after every recorded version:
+      - max_versions: versions kept per document
+      - max_age_seconds: versions older than this are dropped, from all documents
+      - max_bytes: total bytes used by all stored snapshots and deltas
+    The latest version of a document is never dropped.
+
+    Documents are written from several threads and retention prunes the
+    chains of other documents, so the chains and byte accounting are guarded
+    by one lock. It is not held while a new version is diffed against the
+    previous one, the slow part of a write: that only waits for writes to
+    the same document, under a per-document lock.
+    """
+
+    def __init__(self, snapshot_interval: int = 16, max_versions: int = 100,
+                 max_age_seconds: float | None = None, max_bytes: int | None = 8 * 1024 * 1024):
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.max_versions = max(1, max_versions)
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._chains: dict[str, _VersionChain] = {}
+        self._lock = threading.Lock()
+        self._document_locks: dict[str, threading.Lock] = {}
+
+    def __contains__(self, document_name: str) -> bool:
+        return document_name in self._chains
+
+    def record(self, document_name: str, text: str, version: int | None = None) -> int:
+        """Records `text` as the newest version of a document and returns its number."""
+        with self._document_lock(document_name):
+            with self._lock:
+                chain = self._chains.setdefault(document_name, _VersionChain())
+                if version is None:
+                    version = chain.entries[-1].version + 1 if chain.entries else 1
+                elif chain.entries and version <= chain.entries[-1].version:
+                    raise ValueError(f"Version {version} is not newer than {chain.entries[-1].version}.")
+                # Retention never drops the newest version, so this stays the base of the delta
+                base = None
+                if chain.entries and chain.since_snapshot + 1 < self.snapshot_interval:
+                    base = chain.text_at(len(chain.entries) - 1)
+
+            delta = make_delta(base, text) if base is not None else None
+            if delta is not None and delta_size(delta) * 2 >= len(text.encode("utf-8")):
+                delta = None
+
+            with self._lock:
+                if self._chains.get(document_name) is not chain:
+                    # Forgotten in the meantime; start over from a snapshot
+                    chain = self._chains.setdefault(document_name, _VersionChain())
+                    delta = None
+                # Retention may have moved the last snapshot closer in the meantime
+                if delta is not None and chain.since_snapshot + 1 < self.snapshot_interval:
+                    entry = _Version(version, time.time(), delta=delta)
+                    chain.since_snapshot += 1
+                else:
+                    entry = _Version(version, time.time(), snapshot=text)
+                    chain.since_snapshot = 0
+                chain.entries.append(entry)
+                chain.latest_text = text
+                self.total_bytes += entry.size
+                self._enforce_retention(chain)
+            return version
+
+    def _document_lock(self, document_name: str) -> threading.Lock:
+        lock = self._document_locks.get(document_name)
+        if lock is None:
+            with self._lock:
+                lock = self._document_locks.setdefault(document_name, threading.Lock())
+        return lock
+
+    def list_versions(self, document_name: str) -> list[dict]:
+        with self._lock:
+            chain = self._chain(document_name)
+            return [
+                {"version": e.version, "timestamp": e.timestamp, "kind": e.kind, "stored_bytes": e.size}
+                for e in chain.entries
+            ]
+
+    def get(self, document_name: str, version: int) -> str:
+        with self._lock:
+            chain = self._chain(document_name)
+            return chain.text_at(chain.index_of(version))
+
+    def diff(self, document_name: str, from_version: int, to_version: int, context: int = 3) -> str:
+        """Returns a unified diff between two versions of a document."""
+        old = self.get(document_name, from_version)
+        new = self.get(document_name, to_version)
+        # Lines without their line breaks, so a last line without one does not run into the next
+        return "\n".join(difflib.unified_diff(
+            old.splitlines(),
+            new.splitlines(),
+            fromfile=f"{document_name}@{from_version}",
+            tofile=f"{document_name}@{to_version}",
+            n=context,
+            lineterm="",
+        ))
+
+    def release(self, document_name: str) -> None:
+        """Drops the cached newest text of a document; it is rebuilt from the stored versions when needed."""
+        with self._lock:
+            chain = self._chains.get(document_name)
+            if chain:
+                chain.latest_text = None
+
+    def forget(self, document_name: str) -> None:
+        with self._lock:
+            chain = self._chains.pop(document_name, None)
+            if chain:
+                self.total_bytes -= sum(e.size for e in chain.entries)
+
+    def _chain(self, document_name: str) -> _VersionChain:
+        if document_name not in self._chains:
+            raise ValueError(f"No history for document {document_name}.")
+        return self._chains[document_name]
+
+    def _drop_oldest(self, chain: _VersionChain) -> None:
+        oldest = chain.entries[0]
+        if len(chain.entries) > 1 and chain.entries[1].snapshot is None:
+            # The next version becomes the base of the chain, so turn it into
+            # a snapshot before losing the text it was a delta against.
+            successor = chain.entries[1]
+            text = apply_delta(chain.text_at(0), successor.delta)
+            self.total_bytes -= successor.size
+            chain.entries[1] = _Version(successor.version, successor.timestamp, snapshot=text)
+            self.total_bytes += chain.entries[1].size
+        chain.entries.popleft()
+        self.total_bytes -= oldest.size
+        chain.since_snapshot = 0
+        for entry in reversed(chain.entries):
+            if entry.snapshot is not None:
+                break
+            chain.since_snapshot += 1
+
+    def _enforce_retention(self, chain: _VersionChain) -> None:
+        while len(chain.entries) > self.max_versions:
+            self._drop_oldest(chain)
+
+        if self.max_age_seconds is not None:
+            # Sweep every document, so the history of documents nobody edits anymore expires too
+            cutoff = time.time() - self.max_age_seconds
+            for other in self._chains.values():
+                while len(other.entries) > 1 and other.entries[0].timestamp < cutoff:
+                    self._drop_oldest(other)
+
+        if self.max_bytes is not None:
+            while self.total_bytes > self.max_bytes:
+                candidates = [c for c in self._chains.values() if len(c.entries) > 1]
+                if not candidates:
+                    break
+                self._drop_oldest(min(candidates, key=lambda c: c.entries[0].timestamp))
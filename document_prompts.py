@@ -0,0 +1,82 @@
+# Rendering support for prompts that embed a document's content.
+#
+# Embedding the document saves the model a document_reader round trip before
+# it can start. Documents over the size budget are cut to their beginning and
+# end, on line boundaries, with a marker saying how much was left out.
+#
+# Rendered prompts are cached per document version, so repeated get_prompt
+# calls for an unchanged document do not read or render it again. A
+# DocumentStore listener drops a document's entries when it changes.
+
+import threading
+from collections import OrderedDict
+
+# Share of the budget given to the beginning of a truncated document; the rest shows its end
+HEAD_SHARE = 0.75
+
+
+def excerpt(text: str, max_chars: int) -> tuple[str, int]:
+    """Returns `text` cut to about `max_chars` characters and the number of characters left out."""
+    if max_chars < 1:
+        raise ValueError("max_chars must be at least 1.")
+    if len(text) <= max_chars:
+        return text, 0
+    head_chars = int(max_chars * HEAD_SHARE)
+    tail_chars = max_chars - head_chars
+    head = text[:head_chars]
+    # Cut at a line break unless that would lose more than half of the part
+    cut = head.rfind("\n")
+    if cut > head_chars // 2:
+        head = head[:cut + 1]
+    tail = text[len(text) - tail_chars:] if tail_chars else ""
+    cut = tail.find("\n")
+    if 0 <= cut < tail_chars // 2:
+        tail = tail[cut + 1:]
+    omitted = len(text) - len(head) - len(tail)
+    return f"{head}\n[... {omitted} characters omitted ...]\n{tail}", omitted
+
+
+class PromptCache:
+    """Rendered prompts per (document, version, arguments), least recently used out first."""
+
+    def __init__(self, store, max_entries: int = 128):
+        self.store = store
+        self.max_entries = max_entries
+        self._rendered = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        store.add_listener(self.on_change)
+
+    def on_change(self, document_name: str, previous: str | None, text: str, version: int) -> None:
+        with self._lock:
+            for key in [key for key in self._rendered if key[0] == document_name]:
+                del self._rendered[key]
+
+    def render(self, document_name: str, arguments: tuple, render, needs_text: bool = True):
+        """Returns render(text, version) for the current version of a document, from the cache if possible.
+
+        Without `needs_text` the document is not read and `render` gets None as
+        text; the version comes from store.version, which never loads a
+        document, so file documents are not extracted either.
+        """
+        if document_name not in self.store:
+            raise ValueError(f"Document {document_name} not found.")
+        key = (document_name, self.store.version(document_name), arguments)
+        with self._lock:
+            rendered = self._rendered.get(key)
+            if rendered is not None:
+                self._rendered.move_to_end(key)
+                self.hits += 1
+                return rendered
+            self.misses += 1
+        if needs_text:
+            text, version = self.store.snapshot(document_name)
+        else:
+            text, version = None, key[1]
+        rendered = render(text, version)
+        with self._lock:
+            self._rendered[(document_name, version, arguments)] = rendered
+            while len(self._rendered) > self.max_entries:
+                self._rendered.popitem(last=False)
+        return rendered
@@ -0,0 +1,202 @@
+# File-system backed documents.
+#
+# Files are listed from directory metadata only; their text is extracted the
+# first time a document is read. Extracted text is cached on disk keyed by the
+# file's path, mtime and size, so a restart does not extract unchanged files
+# again. Batches of files are extracted in one process pool kept for the
+# life of the source.
+
+import hashlib
+import multiprocessing
+import os
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+def extract_plain_text(path: str) -> str:
+    """Reads Markdown and plain text files."""
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def extract_pdf(path: str) -> str:
+    """Extracts the text of a PDF file (needs the optional `pypdf` package)."""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ValueError("Reading PDF files requires the optional 'pypdf' package.")
+    reader = PdfReader(path)
+    return "\n\n".join(page.extract_text() or "" for page in reader.pages)
+
+
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+def extract_docx(path: str) -> str:
+    """Extracts the paragraphs of a .docx file using only the standard library."""
+    with zipfile.ZipFile(path) as archive:
+        root = ET.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(WORD_NAMESPACE + "p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == WORD_NAMESPACE + "t" and node.text:
+                parts.append(node.text)
+            elif node.tag == WORD_NAMESPACE + "tab":
+                parts.append("\t")
+            elif node.tag == WORD_NAMESPACE + "br":
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs)
+
+
+# Extractors by lower-case file suffix. Use `register_extractor` to add more;
+# extractors must be module-level functions so they can run in a process pool.
+EXTRACTORS = {
+    ".md": extract_plain_text,
+    ".txt": extract_plain_text,
+    ".pdf": extract_pdf,
+    ".docx": extract_docx,
+}
+
+
+def register_extractor(suffix: str, extractor) -> None:
+    """Registers a text extractor for files ending in `suffix` (e.g. '.html')."""
+    EXTRACTORS[suffix.lower()] = extractor
+
+
+def _run_extractor(extractor, path: str) -> str:
+    return extractor(path)
+
+
+class DirectoryDocumentSource:
+    """Serves the files of a directory as documents, extracting text lazily."""
+
+    def __init__(self, root: str, cache_dir: str | None = None, extractors: dict | None = None,
+                 max_workers: int | None = None):
+        self.root = os.path.abspath(root)
+        self.cache_dir = cache_dir or os.path.join(self.root, ".doc_cache")
+        self.extractors = extractors if extractors is not None else EXTRACTORS
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.Lock()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Cache files and their sizes per source path key, from one scan of the cache directory
+        self._cache_files: dict[str, dict[str, int]] = {}
+        self.cache_bytes = 0
+        with os.scandir(self.cache_dir) as entries:
+            for entry in entries:
+                if entry.is_file() and entry.name.endswith(".txt"):
+                    size = entry.stat().st_size
+                    self._cache_files.setdefault(entry.name.partition("-")[0], {})[entry.path] = size
+                    self.cache_bytes += size
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # Not forked: a fork can deadlock on locks held by the server's threads
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                 mp_context=multiprocessing.get_context("forkserver"))
+            return self._pool
+
+    def close(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(cancel_futures=True)
+                self._pool = None
+
+    def _extractor_for(self, name: str):
+        return self.extractors.get(os.path.splitext(name)[1].lower())
+
+    def list_files(self) -> dict[str, os.stat_result]:
+        """Lists the supported files of the directory without reading them."""
+        found = {}
+        with os.scandir(self.root) as entries:
+            for entry in entries:
+                if entry.is_file() and self._extractor_for(entry.name):
+                    found[entry.name] = entry.stat()
+        return found
+
+    def __contains__(self, name: str) -> bool:
+        return (
+            os.sep not in name
+            and self._extractor_for(name) is not None
+            and os.path.isfile(os.path.join(self.root, name))
+        )
+
+    def _cache_path(self, path: str, stat: os.stat_result) -> tuple[str, str]:
+        path_key = hashlib.sha256(path.encode("utf-8")).hexdigest()[:16]
+        version_key = hashlib.sha256(f"{stat.st_mtime_ns}:{stat.st_size}".encode()).hexdigest()[:16]
+        return path_key, os.path.join(self.cache_dir, f"{path_key}-{version_key}.txt")
+
+    def _read_cache(self, cache_path: str) -> str | None:
+        try:
+            with open(cache_path, encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_cache(self, path_key: str, cache_path: str, text: str) -> None:
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, cache_path)
+        size = os.path.getsize(cache_path)
+        with self._lock:
+            files = self._cache_files.setdefault(path_key, {})
+            # Drop entries extracted from older versions of the same file
+            for stale_path in [path for path in files if path != cache_path]:
+                self.cache_bytes -= files.pop(stale_path)
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
+            self.cache_bytes += size - files.get(cache_path, 0)
+            files[cache_path] = size
+
+    def read(self, name: str) -> str:
+        """Returns the text of a document, extracting it on a cache miss."""
+        return self.read_many([name])[name]
+
+    def read_many(self, names: list[str]) -> dict[str, str]:
+        """Returns the text of several documents, extracting misses in a process pool."""
+        texts = {}
+        pending = []
+        for name in names:
+            if name not in self:
+                raise ValueError(f"Document {name} not found.")
+            path = os.path.join(self.root, name)
+            stat = os.stat(path)
+            path_key, cache_path = self._cache_path(path, stat)
+            cached = self._read_cache(cache_path)
+            if cached is not None:
+                texts[name] = cached
+            else:
+                pending.append((name, path, path_key, cache_path))
+
+        if len(pending) == 1:
+            name, path, path_key, cache_path = pending[0]
+            texts[name] = self._extractor_for(name)(path)
+            self._write_cache(path_key, cache_path, texts[name])
+        elif pending:
+            pool = self._executor()
+            futures = [
+                pool.submit(_run_extractor, self._extractor_for(name), path)
+                for name, path, _, _ in pending
+            ]
+            try:
+                for (name, _, path_key, cache_path), future in zip(pending, futures):
+                    texts[name] = future.result()
+                    self._write_cache(path_key, cache_path, texts[name])
+            except BrokenProcessPool:
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                raise ValueError("An extraction process exited unexpectedly; it is restarted on the next read.")
+            finally:
+                for future in futures:
+                    future.cancel()
+        return texts
@@ -0,0 +1,108 @@
+# Size statistics for documents, kept up to date as documents change.
+#
+# Clients use these to plan how much of a document fits in an LLM context
+# without transferring the content. Statistics are additive per line, so an
+# append only has to scan the appended text plus the last, unfinished line of
+# the previous version. After other edits the document is rescanned the next
+# time its statistics are asked for, so writes nobody reads the statistics of
+# (such as a bulk import) do not pay for a scan.
+
+import re
+
+from document_bulk import read_document
+from document_history import changed_region
+
+# Rough token estimate: every run of word characters and every punctuation
+# mark counts as one token. Tokens never span a line break.
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+HEADING_PATTERN = re.compile(r"^(#{1,6})[ \t]+(.+?)[ \t#]*$", re.MULTILINE)
+
+
+def _scan(text: str, first_line: int) -> tuple[int, int, list]:
+    """Returns bytes, tokens and headings of a run of lines starting at line `first_line`."""
+    headings = []
+    if "#" in text:
+        for match in HEADING_PATTERN.finditer(text):
+            line = first_line + text.count("\n", 0, match.start())
+            headings.append({"level": len(match.group(1)), "title": match.group(2), "line": line})
+    return len(text.encode("utf-8")), len(TOKEN_PATTERN.findall(text)), headings
+
+
+class DocumentStats:
+    """Statistics of one version of a document.
+
+    The document is split at its last line break into complete lines and a
+    trailing, possibly empty, partial line which an append may still extend.
+    """
+
+    __slots__ = ("version", "length", "bytes", "tokens", "newlines", "headings",
+                 "tail_start", "tail_bytes", "tail_tokens", "tail_headings")
+
+    @classmethod
+    def compute(cls, text: str, version: int, base: "DocumentStats | None" = None) -> "DocumentStats":
+        stats = cls()
+        stats.version = version
+        stats.length = len(text)
+        if base is None:
+            start, stats.bytes, stats.tokens, stats.newlines, headings = 0, 0, 0, 0, []
+        else:
+            start, stats.bytes, stats.tokens, stats.newlines = base.tail_start, base.bytes, base.tokens, base.newlines
+            headings = list(base.headings)
+
+        tail_start = text.rfind("\n", start) + 1 or start
+        if tail_start > start:
+            added_bytes, added_tokens, added_headings = _scan(text[start:tail_start], stats.newlines + 1)
+            stats.bytes += added_bytes
+            stats.tokens += added_tokens
+            stats.newlines += text.count("\n", start, tail_start)
+            headings.extend(added_headings)
+        stats.headings = headings
+        stats.tail_start = tail_start
+        stats.tail_bytes, stats.tail_tokens, stats.tail_headings = _scan(text[tail_start:], stats.newlines + 1)
+        return stats
+
+    def as_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "characters": self.length,
+            "bytes": self.bytes + self.tail_bytes,
+            "lines": self.newlines + (1 if self.length > self.tail_start else 0),
+            "approx_tokens": self.tokens + self.tail_tokens,
+            "headings": self.headings + self.tail_headings,
+        }
+
+
+class StatsIndex:
+    """Per-document statistics, maintained by a DocumentStore listener."""
+
+    def __init__(self, store):
+        self.store = store
+        self._stats: dict[str, DocumentStats] = {}
+        store.add_listener(self.on_change)
+
+    def on_change(self, document_name: str, previous: str | None, text: str, version: int) -> None:
+        base = self._stats.get(document_name)
+        if (
+            base is None
+            or previous is None
+            or base.version != version - 1
+            or len(text) < base.tail_start
+            # Appends keep all of `previous`; for other edits find where the change starts
+            or not (text.startswith(previous) or changed_region(previous, text)[0] >= base.tail_start)
+        ):
+            self._stats.pop(document_name, None)
+            return
+        self._stats[document_name] = DocumentStats.compute(text, version, base)
+
+    def get(self, document_name: str) -> dict:
+        """Returns the statistics of the current version of a document."""
+        if document_name not in self.store:
+            raise ValueError(f"Document {document_name} not found.")
+        stats = self._stats.get(document_name)
+        if stats is None or stats.version != self.store.version(document_name):
+            # Created or rewritten since the last scan, or never written through the store. Read
+            # without promoting the document into the hot tier, which would evict the working set.
+            text, version = read_document(self.store, document_name)
+            stats = DocumentStats.compute(text, version)
+            self._stats[document_name] = stats
+        return {"document_name": document_name, **stats.as_dict()}
@@ -0,0 +1,505 @@
+# The document collection served by the MCP server.
+#
+# DocumentStore behaves like the plain `docs` dict the tools were written
+# against, but can be backed by a DirectoryDocumentSource: file documents are
+# listed cheaply and only loaded into memory when first read. Writes are kept
+# in memory and never touch the files on disk.
+#
+# Every document carries a version number. Writers serialize on a per-document
+# lock and can make a change conditional on the version they last saw
+# (compare-and-swap). Readers of a hot document never take a lock: text and
+# version are stored together as one immutable tuple, so a reader always sees
+# a consistent pair.
+#
+# Documents are partitioned into namespaces by a "namespace:" prefix on their
+# name (names without one are in the "default" namespace). Each namespace can
+# have a byte quota, checked on every write. A document counts against it from
+# its first load or write until it is deleted, also while evicted from memory.
+# A namespace is only a name prefix used for accounting and filtering, not an
+# access boundary: any caller can read and write the documents of every
+# namespace.
+#
+# Document text lives in up to three tiers:
+#   hot        - plain strings; with compression on, only the `hot_documents`
+#                most recently used documents of at least `compress_min_bytes`
+#   compressed - zlib or lzma bytes in memory, decompressed on the next access
+#   spilled    - with `max_memory` set, the least recently used documents are
+#                evicted once the memory used for text exceeds it: changed
+#                documents are written to disk, unchanged file documents are
+#                dropped and extracted again
+
+import hashlib
+import itertools
+import lzma
+import os
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+DEFAULT_NAMESPACE = "default"
+
+# Codecs for the compressed tier: name -> (compress, decompress). Documents are
+# compressed on the read path when they fall out of the hot set, so both use
+# fast settings.
+CODECS = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+    "lzma": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+class VersionConflictError(ValueError):
+    """Raised when a conditional write finds a different version than expected."""
+
+
+class QuotaExceededError(ValueError):
+    """Raised when a write would take a namespace over its byte quota."""
+
+
+def namespace_of(document_name: str) -> str:
+    """Returns the namespace of a document: the part of its name before the first ':'."""
+    namespace, separator, _ = document_name.partition(":")
+    return namespace if separator and namespace else DEFAULT_NAMESPACE
+
+
+def text_bytes(text: str) -> int:
+    # isascii() is a constant-time flag check, so ASCII texts are never encoded
+    return len(text) if text.isascii() else len(text.encode("utf-8"))
+
+
+class SpillStore:
+    """Texts of evicted documents, one file per document in a scratch directory."""
+
+    def __init__(self, directory: str | None = None):
+        self.directory = directory
+
+    def _path(self, document_name: str) -> str:
+        if self.directory is None:
+            self.directory = tempfile.mkdtemp(prefix="docs-spill-")
+        os.makedirs(self.directory, exist_ok=True)
+        return os.path.join(self.directory, hashlib.sha256(document_name.encode("utf-8")).hexdigest()[:32] + ".txt")
+
+    def put(self, document_name: str, text: str) -> None:
+        path = self._path(document_name)
+        with open(path + ".tmp", "w", encoding="utf-8", errors="surrogatepass", newline="") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def get(self, document_name: str) -> str:
+        with open(self._path(document_name), encoding="utf-8", errors="surrogatepass", newline="") as f:
+            return f.read()
+
+    def delete(self, document_name: str) -> None:
+        try:
+            os.remove(self._path(document_name))
+        except FileNotFoundError:
+            pass
+
+
+class DocumentStore(MutableMapping):
+    """Dict-like document collection with optional lazily loaded file documents."""
+
+    def __init__(self, documents: dict[str, str] | None = None, source=None, quotas: dict[str, int] | None = None,
+                 default_quota: int | None = None, max_memory: int | None = None, spill: SpillStore | None = None,
+                 compression: str | None = None, hot_documents: int = 32, compress_min_bytes: int = 4096):
+        if compression is not None and compression not in CODECS:
+            raise ValueError(f"Unknown compression {compression!r}. Use one of: {', '.join(CODECS)}")
+        self._docs: dict[str, tuple[str, int]] = {}
+        self._compressed: dict[str, tuple[bytes, int]] = {}  # cold document -> (compressed text, version)
+        self._spilled: dict[str, int] = {}  # evicted document -> its version
+        self._hot = OrderedDict()  # compressible hot documents, least recently used first
+        self._clean = set()  # loaded from the source and never written
+        self._deleted = set()
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self._listeners = []
+        self._eviction_listeners = []
+        self.source = source
+        self.quotas = quotas or {}
+        self.default_quota = default_quota
+        self.max_memory = max_memory
+        self.spill = spill or SpillStore()
+        self.compression = compression
+        self.hot_documents = hot_documents
+        self.compress_min_bytes = compress_min_bytes
+
+        # Byte accounting, guarded by _accounting
+        self._accounting = threading.Lock()
+        self._sizes: dict[str, int] = {}  # text bytes of every document loaded or written, also once evicted
+        self._resident: dict[str, int] = {}  # bytes in memory, compressed size for compressed documents
+        self._resident_bytes = 0
+        self._usage: dict[str, int] = {}  # text bytes per namespace
+        self._clock = itertools.count()
+        self._last_used: dict[str, int] = {}
+        self.evictions = 0
+        self.faults = 0
+        self.compressions = 0
+        self.decompressions = 0
+
+        for name, text in (documents or {}).items():
+            self._docs[name] = (text, 1)
+            self._account(name, text)
+            self._make_hot(name, text)
+        self._demote()
+
+    def __contains__(self, document_name) -> bool:
+        if document_name in self._docs or document_name in self._compressed or document_name in self._spilled:
+            return True
+        return (
+            self.source is not None
+            and document_name not in self._deleted
+            and document_name in self.source
+        )
+
+    def _touch(self, document_name: str) -> None:
+        self._last_used[document_name] = next(self._clock)
+        if document_name in self._hot:
+            try:
+                self._hot.move_to_end(document_name)
+            except KeyError:
+                # Compressed by another thread in the meantime
+                pass
+
+    def _entry(self, document_name: str) -> tuple[str, int]:
+        entry = self._docs.get(document_name)
+        if entry is not None:
+            self._touch(document_name)
+            return entry
+        with self.lock(document_name):
+            entry = self._load(document_name)
+        self._demote()
+        self._evict()
+        return entry
+
+    def _load(self, document_name: str) -> tuple[str, int]:
+        """Returns a hot document, decompressing it or reading it back if needed. Needs the document's lock."""
+        entry = self._docs.get(document_name)
+        if entry is not None:
+            self._touch(document_name)
+            return entry
+        if document_name in self._compressed:
+            data, version = self._compressed[document_name]
+            entry = (CODECS[self.compression][1](data).decode("utf-8", "surrogatepass"), version)
+            self.decompressions += 1
+        elif document_name in self._spilled:
+            entry = (self.spill.get(document_name), self._spilled[document_name])
+            self.faults += 1
+        elif document_name in self:
+            entry = (self.source.read(document_name), 1)
+            self._clean.add(document_name)
+        else:
+            raise KeyError(document_name)
+        self._account(document_name, entry[0])
+        # Publish the hot entry before removing the cold copy so readers always find one
+        self._docs[document_name] = entry
+        self._compressed.pop(document_name, None)
+        if self._spilled.pop(document_name, None) is not None:
+            self.spill.delete(document_name)
+        self._make_hot(document_name, entry[0])
+        return entry
+
+    def _make_hot(self, document_name: str, text: str) -> None:
+        self._last_used[document_name] = next(self._clock)
+        if self.compression is not None and len(text) >= self.compress_min_bytes:
+            self._hot[document_name] = True
+            self._hot.move_to_end(document_name)
+        else:
+            self._hot.pop(document_name, None)
+
+    def __getitem__(self, document_name: str) -> str:
+        return self._entry(document_name)[0]
+
+    def __setitem__(self, document_name: str, content: str) -> None:
+        self.modify(document_name, lambda previous: content)
+
+    def __delitem__(self, document_name: str) -> None:
+        with self.lock(document_name):
+            if document_name not in self:
+                raise KeyError(document_name)
+            self._docs.pop(document_name, None)
+            self._compressed.pop(document_name, None)
+            self._hot.pop(document_name, None)
+            if self._spilled.pop(document_name, None) is not None:
+                self.spill.delete(document_name)
+            self._clean.discard(document_name)
+            self._last_used.pop(document_name, None)
+            self._account(document_name, None)
+            if self.source is not None:
+                self._deleted.add(document_name)
+
+    def __iter__(self):
+        yield from list(self._docs)
+        for tier in (self._compressed, self._spilled):
+            for name in list(tier):
+                if name not in self._docs:
+                    yield name
+        if self.source is not None:
+            for name in self.source.list_files():
+                if (
+                    name not in self._docs
+                    and name not in self._compressed
+                    and name not in self._spilled
+                    and name not in self._deleted
+                ):
+                    yield name
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def is_loaded(self, document_name: str) -> bool:
+        return document_name in self._docs or document_name in self._compressed
+
+    def preload(self, document_names: list[str] | None = None) -> list[str]:
+        """Loads file documents into memory in one batch and returns their names."""
+        if self.source is None:
+            return []
+        if document_names is None:
+            document_names = list(self)
+        missing = [
+            name for name in document_names
+            if not self.is_loaded(name) and name not in self._spilled and name in self
+        ]
+        for name, text in self.source.read_many(missing).items():
+            with self.lock(name):
+                if not self.is_loaded(name) and name not in self._spilled:
+                    self._account(name, text)
+                    self._docs[name] = (text, 1)
+                    self._clean.add(name)
+                    self._make_hot(name, text)
+            self._demote()
+        self._evict()
+        return missing
+
+    def lock(self, document_name: str) -> threading.Lock:
+        """Returns the lock that serializes writes to one document."""
+        lock = self._locks.get(document_name)
+        if lock is None:
+            with self._locks_guard:
+                lock = self._locks.setdefault(document_name, threading.Lock())
+        return lock
+
+    def version(self, document_name: str) -> int:
+        """Returns the current version of a document (0 if it does not exist), without loading it."""
+        if document_name not in self:
+            return 0
+        entry = self._docs.get(document_name) or self._compressed.get(document_name)
+        if entry is not None:
+            return entry[1]
+        spilled = self._spilled.get(document_name)
+        if spilled is not None:
+            return spilled
+        # A source document never loaded, or dropped while unchanged, is at its first version,
+        # unless it was loaded (and maybe written) since the checks above
+        entry = self._docs.get(document_name)
+        return entry[1] if entry is not None else 1
+
+    def peek(self, document_name: str) -> str:
+        """Returns a document's text without making it hot or loading it into memory.
+
+        Meant for scans over many documents, which would otherwise push the
+        documents clients are actually using out of the hot set.
+        """
+        entry = self._docs.get(document_name)
+        if entry is not None:
+            return entry[0]
+        compressed = self._compressed.get(document_name)
+        if compressed is not None:
+            return CODECS[self.compression][1](compressed[0]).decode("utf-8", "surrogatepass")
+        if document_name in self._spilled:
+            try:
+                return self.spill.get(document_name)
+            except FileNotFoundError:
+                # Read back into memory in the meantime
+                return self[document_name]
+        if document_name in self:
+            return self.source.read(document_name)
+        raise KeyError(document_name)
+
+    def snapshot(self, document_name: str) -> tuple[str, int]:
+        """Returns the text and version of a document as one consistent pair."""
+        return self._entry(document_name)
+
+    def add_listener(self, listener) -> None:
+        """Registers `listener(document_name, previous, text, version)`.
+
+        Listeners run while the document's write lock is held, so they see
+        changes to a document in version order.
+        """
+        self._listeners.append(listener)
+
+    def add_eviction_listener(self, listener) -> None:
+        """Registers `listener(document_name)`, called after a document's text is compressed or evicted."""
+        self._eviction_listeners.append(listener)
+
+    def modify(self, document_name: str, change, expected_version: int | None = None) -> tuple[str | None, str, int]:
+        """Atomically replaces a document with `change(previous_text)`.
+
+        `previous_text` is None for a new document. When `expected_version` is
+        given the change is only applied if the document is still at that
+        version (0 meaning "does not exist yet"). Returns the previous text,
+        the new text and the new version.
+        """
+        with self.lock(document_name):
+            if document_name in self:
+                previous, version = self._load(document_name)
+            else:
+                previous, version = None, 0
+            if expected_version is not None and expected_version != version:
+                raise VersionConflictError(
+                    f"Document {document_name} is at version {version}, expected {expected_version}."
+                )
+            text = change(previous)
+            self._account(document_name, text, check_quota=True)
+            self._docs[document_name] = (text, version + 1)
+            self._make_hot(document_name, text)
+            self._clean.discard(document_name)
+            self._deleted.discard(document_name)
+            for listener in self._listeners:
+                listener(document_name, previous, text, version + 1)
+        self._demote()
+        self._evict()
+        return previous, text, version + 1
+
+    def _account(self, document_name: str, text: str | None, check_quota: bool = False,
+                 resident_size: int | None = None) -> None:
+        """Records the text now held for a document (None if it is gone).
+
+        `resident_size` is the memory it takes when that differs from the
+        text's size, i.e. when it is held compressed.
+        """
+        size = text_bytes(text) if text is not None else 0
+        namespace = namespace_of(document_name)
+        with self._accounting:
+            previous_size = self._sizes.get(document_name, 0)
+            used = self._usage.get(namespace, 0) - previous_size + size
+            if check_quota and size > previous_size:
+                quota = self.quotas.get(namespace, self.default_quota)
+                if quota is not None and used > quota:
+                    raise QuotaExceededError(
+                        f"Writing {document_name} would take namespace {namespace} to {used} bytes, "
+                        f"over its quota of {quota} bytes."
+                    )
+            self._usage[namespace] = used
+            self._set_resident(document_name, None if text is None else size if resident_size is None else resident_size)
+            if text is None:
+                self._sizes.pop(document_name, None)
+            else:
+                self._sizes[document_name] = size
+
+    def _set_resident(self, document_name: str, size: int | None) -> None:
+        """Sets the memory a document takes (None once it is out of memory). Needs _accounting."""
+        self._resident_bytes -= self._resident.pop(document_name, 0)
+        if size is not None:
+            self._resident[document_name] = size
+            self._resident_bytes += size
+
+    def _demote(self) -> None:
+        """Compresses the least recently used hot documents beyond `hot_documents`."""
+        if self.compression is None:
+            return
+        compress = CODECS[self.compression][0]
+        for _ in range(len(self._hot) - self.hot_documents):
+            try:
+                name = next(iter(self._hot))
+            except (StopIteration, RuntimeError):
+                return
+            lock = self.lock(name)
+            # Never wait for a writer here: the caller may hold another document's lock
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                if not self._hot.pop(name, False):
+                    continue
+                entry = self._docs.get(name)
+                if entry is None:
+                    continue
+                data = compress(entry[0].encode("utf-8", "surrogatepass"))
+                if len(data) >= self._sizes.get(name, 0) * 0.9:
+                    # Not worth it; leave it uncompressed until it changes
+                    continue
+                self._compressed[name] = (data, entry[1])
+                del self._docs[name]
+                with self._accounting:
+                    self._set_resident(name, len(data))
+                self.compressions += 1
+            finally:
+                lock.release()
+            for listener in self._eviction_listeners:
+                listener(name)
+
+    def _evict(self) -> None:
+        """Evicts least recently used documents until the memory budget is met."""
+        if self.max_memory is None or self._resident_bytes <= self.max_memory:
+            return
+        candidates = list(self._docs) + [name for name in list(self._compressed) if name not in self._docs]
+        for name in sorted(candidates, key=lambda n: self._last_used.get(n, 0)):
+            if self._resident_bytes <= self.max_memory:
+                break
+            lock = self.lock(name)
+            # Never wait for a writer here: the caller may hold another document's lock
+            if not lock.acquire(blocking=False):
+                continue
+            try:
+                entry = self._docs.get(name)
+                if entry is None and name in self._compressed:
+                    data, version = self._compressed[name]
+                    entry = (None, version)
+                if entry is None:
+                    continue
+                if name in self._clean:
+                    # Unchanged file document: extract it again when needed
+                    self._clean.discard(name)
+                else:
+                    text = entry[0]
+                    if text is None:
+                        text = CODECS[self.compression][1](data).decode("utf-8", "surrogatepass")
+                    self.spill.put(name, text)
+                    self._spilled[name] = entry[1]
+                # Out of memory, but its bytes still count against the namespace quota
+                with self._accounting:
+                    self._set_resident(name, None)
+                self._docs.pop(name, None)
+                self._compressed.pop(name, None)
+                self._hot.pop(name, None)
+                self.evictions += 1
+            finally:
+                lock.release()
+            for listener in self._eviction_listeners:
+                listener(name)
+
+    def usage(self) -> dict[str, dict]:
+        """Returns documents, bytes and quota per namespace."""
+        with self._accounting:
+            documents: dict[str, int] = {}
+            for name in self._sizes:
+                namespace = namespace_of(name)
+                documents[namespace] = documents.get(namespace, 0) + 1
+            return {
+                namespace: {
+                    "documents": documents.get(namespace, 0),
+                    "bytes": used,
+                    "quota": self.quotas.get(namespace, self.default_quota),
+                }
+                for namespace, used in sorted(self._usage.items())
+            }
+
+    def memory(self) -> dict:
+        """Returns how document text is held: hot, compressed or spilled, and the bytes compression saves."""
+        with self._accounting:
+            compressed_bytes = sum(self._resident.get(name, 0) for name in self._compressed)
+            uncompressed_bytes = sum(self._sizes.get(name, 0) for name in self._compressed)
+        return {
+            "resident_bytes": self._resident_bytes,
+            "max_memory": self.max_memory,
+            "compression": self.compression,
+            "hot_documents": len(self._docs),
+            "compressed_documents": len(self._compressed),
+            "compressed_bytes": compressed_bytes,
+            "saved_bytes": uncompressed_bytes - compressed_bytes,
+            "spilled_documents": len(self._spilled),
+            "compressions": self.compressions,
+            "decompressions": self.decompressions,
+            "evictions": self.evictions,
+            "faults": self.faults,
+        }
@@ -1,7 +1,8 @@
 import asyncio
 import sys
-from mcp import ClientSession, StdioServerParameters
+from mcp import StdioServerParameters
 from mcp.client.stdio import stdio_client
+from tracing import TracedClientSession, tracer
 
 # Add prompt-toolkit for autocomplete functionality
 try:
@@ -23,19 +24,20 @@ class MCPResourceBrowser:
     
     async def connect_to_server(self):
         """Connect to the MCP server using proper context management"""
-        server_params = StdioServerParameters(
-            command="uv",
-            args=["run", "/Users/bhogaai/model-context-protocol/mcp_server.py"],
-            env=None
-        )
-        
-        # Use proper context management
-        self.stdio_client_context = stdio_client(server_params)
-        read, write = await self.stdio_client_context.__aenter__()
-        
-        self.session_context = ClientSession(read, write)
-        self.session = await self.session_context.__aenter__()
-        await self.session.initialize()
+        with tracer.span("connect"):
+            server_params = StdioServerParameters(
+                command="uv",
+                args=["run", "/Users/bhogaai/model-context-protocol/mcp_server.py"],
+                env=tracer.child_env()
+            )
+            
+            # Use proper context management
+            self.stdio_client_context = stdio_client(server_params)
+            read, write = await self.stdio_client_context.__aenter__()
+            
+            self.session_context = TracedClientSession(read, write)
+            self.session = await self.session_context.__aenter__()
+            await self.session.initialize()
         
         print("✅ Connected to MCP server!")
     
@@ -51,6 +53,10 @@ class MCPResourceBrowser:
     
     async def load_resources(self):
         """Load available resources from the server"""
+        with tracer.span("load_resources"):
+            await self._load_resources()
+
+    async def _load_resources(self):
         # Get list of resources
         print("🔍 Loading resources...")
         resources_response = await self.session.list_resources()
@@ -341,7 +347,9 @@ class MCPResourceBrowser:
                 try:
                     command = await self.get_input_with_autocomplete()  # Add await here
                     
-                    if not await self.process_command(command):
+                    with tracer.span("process_command", command=command):
+                        keep_going = await self.process_command(command)
+                    if not keep_going:
                         break
                         
                 except KeyboardInterrupt:
@@ -362,12 +370,15 @@ class MCPResourceBrowser:
     
     async def run_command_mode(self, command):
         """Run a single command and exit"""
-        try:
-            await self.connect_to_server()
-            await self.load_resources()
-            await self.process_command(command)
-        finally:
-            await self.disconnect_from_server()
+        with tracer.span("command", command=command):
+            try:
+                await self.connect_to_server()
+                await self.load_resources()
+                with tracer.span("process_command"):
+                    await self.process_command(command)
+            finally:
+                with tracer.span("disconnect"):
+                    await self.disconnect_from_server()
 
 async def main():
     """Main function"""
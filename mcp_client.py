@@ -1,20 +1,31 @@
 # Generated by TRAE IDE
+#
+# Two modes:
+#   python mcp_client.py demo   - walks through the server's tools, resources and prompts
+#   python mcp_client.py load   - open-loop load generator, see `python mcp_client.py load --help`
 
+import argparse
 import asyncio
 import json
-from mcp import ClientSession, StdioServerParameters
+import random
+import shlex
+import sys
+import time
+from contextlib import AsyncExitStack
+from mcp import StdioServerParameters
 from mcp.client.stdio import stdio_client
+from mcp.client.streamable_http import streamablehttp_client
+from tracing import TracedClientSession, tracer
 
-async def main():
-    # Server parameters - this will start your mcp_server.py
-    server_params = StdioServerParameters(
-        command="uv",
-        args=["run", "mcp_server.py"],
-        env=None
-    )
-    
+async def run_demo(server_params):
+    # With TRACE_FILE set, the whole demo is one trace, including the server's startup
+    with tracer.span("demo"):
+        server_params.env = tracer.child_env(server_params.env)
+        await demo_session(server_params)
+
+async def demo_session(server_params):
     async with stdio_client(server_params) as (read, write):
-        async with ClientSession(read, write) as session:
+        async with TracedClientSession(read, write) as session:
             # Initialize the connection
             await session.initialize()
             
@@ -136,5 +147,187 @@ async def main():
             except Exception as e:
                 print(f"Prompt failed: {e}")
 
+# Load generation
+#
+# Requests are issued open-loop: the i-th request is due at start + i / rate,
+# whether or not earlier requests have finished, and is spread round-robin
+# over the sessions. Latency is reported twice: service time (from when the
+# request was actually sent) and corrected latency (from when it was due).
+# The corrected figure includes any time a request spent waiting to be sent,
+# so a stalled server cannot hide its stalls by slowing the load down
+# (coordinated omission).
+
+# Default weighted mix of calls; override with --mix path/to/mix.json using the same shape
+DEFAULT_MIX = [
+    {"weight": 4, "kind": "resource", "uri": "docs://documents/deposition.md"},
+    {"weight": 2, "kind": "resource", "uri": "docs://documents"},
+    {"weight": 3, "kind": "tool", "name": "document_reader", "arguments": {"document_name": "plan.md"}},
+    {"weight": 1, "kind": "tool", "name": "add_numbers", "arguments": {"number1": 15, "number2": 25}},
+    {"weight": 1, "kind": "tool", "name": "get_document_stats", "arguments": {}},
+    {"weight": 1, "kind": "prompt", "name": "format_doc_prompt", "arguments": {"doc_id": "deposition.md"}},
+]
+
+
+def operation_label(operation):
+    return f"{operation['kind']}:{operation.get('name') or operation.get('uri')}"
+
+
+async def issue(session, operation):
+    """Sends one operation and raises if the server reports an error."""
+    if operation["kind"] == "tool":
+        result = await session.call_tool(operation["name"], arguments=operation.get("arguments", {}))
+        if result.isError:
+            raise RuntimeError(result.content[0].text if result.content else "tool error")
+    elif operation["kind"] == "resource":
+        await session.read_resource(operation["uri"])
+    elif operation["kind"] == "prompt":
+        await session.get_prompt(operation["name"], arguments=operation.get("arguments", {}))
+    else:
+        raise ValueError(f"Unknown operation kind {operation['kind']}")
+
+
+async def open_sessions(stack, args):
+    sessions = []
+    for _ in range(args.sessions):
+        with tracer.span("connect", transport=args.transport):
+            if args.transport == "http":
+                read, write, _ = await stack.enter_async_context(streamablehttp_client(args.url))
+            else:
+                command = shlex.split(args.command)
+                server_params = StdioServerParameters(command=command[0], args=command[1:], env=tracer.child_env())
+                read, write = await stack.enter_async_context(stdio_client(server_params))
+            session = await stack.enter_async_context(TracedClientSession(read, write))
+            await session.initialize()
+        sessions.append(session)
+    return sessions
+
+
+def percentiles(values):
+    values = sorted(values)
+    if not values:
+        return {}
+    pick = lambda p: values[min(len(values) - 1, int(p * len(values)))] * 1000
+    return {"p50": pick(0.50), "p90": pick(0.90), "p99": pick(0.99), "p99.9": pick(0.999), "max": values[-1] * 1000}
+
+
+async def run_load(args):
+    mix = DEFAULT_MIX
+    if args.mix:
+        with open(args.mix) as f:
+            mix = json.load(f)
+    weights = [operation.get("weight", 1) for operation in mix]
+    rng = random.Random(args.seed)
+
+    samples = []  # (label, due, sent, finished, error)
+    in_flight = 0
+    dropped = 0
+
+    async def one(session, operation, due):
+        nonlocal in_flight
+        sent = time.perf_counter()
+        error = None
+        try:
+            await issue(session, operation)
+        except Exception as e:
+            error = type(e).__name__
+        finally:
+            in_flight -= 1
+        samples.append((operation_label(operation), due, sent, time.perf_counter(), error))
+
+    async with AsyncExitStack() as stack:
+        connect_started = time.perf_counter()
+        sessions = await open_sessions(stack, args)
+        print(f"Opened {len(sessions)} {args.transport} session(s) in {time.perf_counter() - connect_started:.2f}s", file=sys.stderr)
+
+        tasks = []
+        total = int(args.rate * (args.warmup + args.duration))
+        start = time.perf_counter()
+        measure_from = start + args.warmup
+        for i in range(total):
+            due = start + i / args.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            if in_flight >= args.max_in_flight:
+                dropped += 1
+                continue
+            in_flight += 1
+            operation = rng.choices(mix, weights)[0]
+            tasks.append(asyncio.create_task(one(sessions[i % len(sessions)], operation, due)))
+        await asyncio.gather(*tasks)
+        end = time.perf_counter()
+
+    measured = [sample for sample in samples if sample[1] >= measure_from]
+    errors = {}
+    for label, _, _, _, error in measured:
+        if error:
+            errors[f"{label} {error}"] = errors.get(f"{label} {error}", 0) + 1
+    by_operation = {}
+    for label, due, sent, finished, error in measured:
+        by_operation.setdefault(label, []).append(finished - due)
+
+    report = {
+        "transport": args.transport,
+        "sessions": args.sessions,
+        "target_rate": args.rate,
+        "achieved_rate": len(measured) / max(end - measure_from, 1e-9),
+        "requests": len(measured),
+        "errors": sum(errors.values()),
+        "dropped": dropped,
+        "service_latency_ms": percentiles([finished - sent for _, _, sent, finished, _ in measured]),
+        "corrected_latency_ms": percentiles([finished - due for _, due, _, finished, _ in measured]),
+        "by_operation_corrected_latency_ms": {label: percentiles(values) for label, values in sorted(by_operation.items())},
+        "error_breakdown": errors,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"Target {args.rate:.1f} req/s, achieved {report['achieved_rate']:.1f} req/s over {args.duration}s "
+          f"({report['requests']} requests, {report['errors']} errors, {dropped} dropped)")
+    for name in ("service_latency_ms", "corrected_latency_ms"):
+        values = report[name]
+        if values:
+            print(f"{name:>22}: " + "  ".join(f"{k}={v:.2f}" for k, v in values.items()))
+    print("Corrected latency by operation (ms):")
+    for label, values in report["by_operation_corrected_latency_ms"].items():
+        print(f"  {label:45s} n={len(by_operation[label]):6d}  " + "  ".join(f"{k}={v:.2f}" for k, v in values.items()))
+    for label, count in errors.items():
+        print(f"  error {label}: {count}")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="MCP demo client and load generator")
+    subcommands = parser.add_subparsers(dest="mode")
+
+    demo = subcommands.add_parser("demo", help="walk through the server's tools, resources and prompts")
+    demo.add_argument("--command", default="uv run mcp_server.py", help="command that starts the stdio server")
+
+    load = subcommands.add_parser("load", help="open-loop load generator")
+    load.add_argument("--transport", choices=["stdio", "http"], default="stdio")
+    load.add_argument("--command", default="uv run mcp_server.py", help="command that starts each stdio server")
+    load.add_argument("--url", default="http://127.0.0.1:8000/mcp", help="server URL for the http transport")
+    load.add_argument("--sessions", type=int, default=4, help="concurrent client sessions")
+    load.add_argument("--rate", type=float, default=50.0, help="target requests per second across all sessions")
+    load.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    load.add_argument("--warmup", type=float, default=2.0, help="seconds of load before measuring")
+    load.add_argument("--mix", help="JSON file with a weighted list of operations (see DEFAULT_MIX)")
+    load.add_argument("--max-in-flight", type=int, default=10000, help="drop requests beyond this many outstanding")
+    load.add_argument("--seed", type=int, default=None)
+    load.add_argument("--json", action="store_true", help="print the report as JSON")
+
+    if not argv or argv[0] not in ("demo", "load", "-h", "--help"):
+        argv = ["demo"] + list(argv)
+    return parser.parse_args(argv)
+
+
+async def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if args.mode == "load":
+        await run_load(args)
+    else:
+        command = shlex.split(args.command)
+        await run_demo(StdioServerParameters(command=command[0], args=command[1:], env=None))
+
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
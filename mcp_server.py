@@ -17,17 +17,76 @@
 
 
 # STEP 0 : Import dependencies
+import time
+startTime = time.time()
+
 from dotenv import load_dotenv
 load_dotenv()
 
+import asyncio
+import base64
+import fnmatch
+import io
+import itertools
+import json
 import os
+import tarfile
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from urllib.parse import urlencode
+import numpy as np
 import yfinance as yf
+from curl_cffi.requests.exceptions import ConnectionError as CurlConnectionError, Timeout as CurlTimeout
+from yfinance.exceptions import YFRateLimitError, YFTickerMissingError
 import requests
+import bulk_math
+from document_bulk import IMPORT_MODES, TarWriter, detect_format, import_document, ndjson_record, read_document, read_ndjson, read_tar
+from document_grep import ParallelGrep
+from document_history import DocumentHistory, changed_region
+from document_prompts import PromptCache, excerpt
+from document_sources import DirectoryDocumentSource
+from document_stats import StatsIndex
+from document_store import DocumentStore, SpillStore, namespace_of
+from price_history import FIELDS, PriceHistoryCache, align, check_ticker, compute_indicators, from_day, to_json_array
+from profiling import LoopLagMonitor, SamplingProfiler
+from tracing import instrument_server, tracer
+from upstream import TRANSIENT_ERRORS, Upstream, UpstreamError, check_response
+from upstream_replay import UpstreamReplay
+from warmup import AccessStats, WarmUp
+from worker_pool import ShardedWorkers
 
 weatherAPIKey = str(os.getenv('weatherAPIKey'))
 
+# UPSTREAM_MODE=record saves live responses to UPSTREAM_FIXTURES and
+# UPSTREAM_MODE=replay serves them from a local stand-in (see upstream_replay.py)
+replay = UpstreamReplay.from_env()
+weatherAPIBaseUrl = os.getenv('weatherAPIBaseUrl', 'http://api.weatherapi.com/v1')
+exchangeRateAPIBaseUrl = os.getenv('exchangeRateAPIBaseUrl', 'https://v6.exchangerate-api.com/v6/6f9f5f76947ce2150d20b85c')
+# By default yfinance logs failed requests and returns an empty frame, which would
+# look like a ticker without data. Have it raise instead, so failures are retried.
+if hasattr(yf, "config"):
+    yf.config.debug.hide_exceptions = False
+    yahooHistoryOptions = {}
+else:
+    yahooHistoryOptions = {"raise_errors": True}
+
+# Daily price history per ticker, cached on disk as .npz column arrays
+priceCache = PriceHistoryCache(os.getenv('PRICE_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.price_cache')))
+
+# Call policy per upstream API: rate limit with a bounded wait queue, deadline,
+# jittered retries, circuit breaker and response cache. Override with e.g.
+# WEATHERAPI_RATE, WEATHERAPI_MAX_QUEUE, WEATHERAPI_DEADLINE, WEATHERAPI_RETRIES,
+# WEATHERAPI_BREAKER_FAILURES or WEATHERAPI_CACHE_TTL
+upstreams = {
+    "weatherapi": Upstream.from_env("weatherapi", cache_ttl=300.0),
+    "exchangerate": Upstream.from_env("exchangerate", cache_ttl=3600.0),
+    # yfinance fetches through curl_cffi and reports Yahoo's 429s as YFRateLimitError
+    "yahoo": Upstream.from_env("yahoo", rate=2.0, burst=5.0, cache_ttl=60.0,
+                               transient_errors=TRANSIENT_ERRORS + (CurlConnectionError, CurlTimeout, YFRateLimitError)),
+}
+
 # Input data for MCP TOOLS
-docs = {
+sample_docs = {
     "deposition.md": "This deposition covers the testimony of Angela Smith, P.E.",
     "report.pdf": "The report details the state of a 20m condenser tower.",
     "financials.docx": "These financials outline the project's budget and expenditures",
@@ -36,12 +95,154 @@ docs = {
     "spec.txt": "These specifications define the technical requirements for the equipment"
 }
 
+# Serve real files when DOCS_DIR is set; their text is extracted on first read
+# and cached on disk (DOCS_CACHE_DIR, defaults to DOCS_DIR/.doc_cache)
+#
+# Documents named "namespace:name" belong to that namespace (e.g. one per team).
+# Namespaces are for quotas and filtering only; they do not isolate clients.
+# NAMESPACE_QUOTAS sets byte quotas per namespace ("team-a=1000000,team-b=5000000")
+# and NAMESPACE_QUOTA_BYTES a quota for all others. Once the document texts in
+# memory exceed STORE_MAX_MEMORY_BYTES, the least recently used are spilled to
+# STORE_SPILL_DIR (a temporary directory by default) until they are read again.
+# Apart from the STORE_HOT_DOCUMENTS most recently used, documents of at least
+# STORE_COMPRESS_MIN_BYTES are kept compressed with STORE_COMPRESSION
+# (zlib, lzma or none).
+def parse_quotas(value: str) -> dict[str, int]:
+    quotas = {}
+    for item in value.split(','):
+        if item.strip():
+            namespace, _, quota = item.partition('=')
+            quotas[namespace.strip()] = int(quota)
+    return quotas
+
+storeOptions = dict(
+    quotas=parse_quotas(os.getenv('NAMESPACE_QUOTAS', '')),
+    default_quota=int(os.getenv('NAMESPACE_QUOTA_BYTES')) if os.getenv('NAMESPACE_QUOTA_BYTES') else None,
+    max_memory=int(os.getenv('STORE_MAX_MEMORY_BYTES')) if os.getenv('STORE_MAX_MEMORY_BYTES') else None,
+    spill=SpillStore(os.getenv('STORE_SPILL_DIR')),
+    compression=None if os.getenv('STORE_COMPRESSION', 'zlib') == 'none' else os.getenv('STORE_COMPRESSION', 'zlib'),
+    hot_documents=int(os.getenv('STORE_HOT_DOCUMENTS', '32')),
+    compress_min_bytes=int(os.getenv('STORE_COMPRESS_MIN_BYTES', '4096')),
+)
+docsDir = os.getenv('DOCS_DIR')
+if docsDir:
+    docs = DocumentStore(source=DirectoryDocumentSource(docsDir, cache_dir=os.getenv('DOCS_CACHE_DIR')), **storeOptions)
+else:
+    docs = DocumentStore(sample_docs, **storeOptions)
+
+# Version history of the documents, stored as deltas against periodic snapshots
+history = DocumentHistory(
+    snapshot_interval=int(os.getenv('HISTORY_SNAPSHOT_INTERVAL', '16')),
+    max_versions=int(os.getenv('HISTORY_MAX_VERSIONS', '100')),
+    max_age_seconds=float(os.getenv('HISTORY_MAX_AGE_SECONDS')) if os.getenv('HISTORY_MAX_AGE_SECONDS') else None,
+    max_bytes=int(os.getenv('HISTORY_MAX_BYTES', str(8 * 1024 * 1024))),
+)
+
+def record_version(document_name: str, previous: str | None, text: str, version: int) -> None:
+    """Records every change to a document in its version history."""
+    if previous is None:
+        # A new document's first version is recorded from the store once it is edited or its
+        # history is read, so a bulk import does not keep a second copy of every document
+        return
+    try:
+        if document_name not in history:
+            # First edit of a document that existed before history was kept
+            history.record(document_name, previous, version - 1)
+        history.record(document_name, text, version)
+    except Exception:
+        # The write is already applied; a broken history must not fail it. Start the
+        # document's history over, from the current version on its next read.
+        history.forget(document_name)
+
+def ensure_history(document_name: str) -> None:
+    """Records the current content as the only version of a document that was never edited."""
+    if document_name in history:
+        return
+    if document_name not in docs:
+        raise ValueError(f"Document {document_name} not found.")
+    # Read before taking the lock: loading a cold document takes it too. An edit in
+    # between records the history itself, which the check under the lock catches.
+    text, version = docs.snapshot(document_name)
+    with docs.lock(document_name):
+        if document_name not in history:
+            history.record(document_name, text, version)
+
+docs.add_listener(record_version)
+# History shares the newest text with the store, so let it go when the store compresses or evicts a document
+docs.add_eviction_listener(history.release)
+
+# Size statistics (bytes, lines, approximate tokens, headings), updated on every write
+stats = StatsIndex(docs)
+
+# Rendered document prompts, cached per document version
+prompts = PromptCache(docs, max_entries=int(os.getenv('PROMPT_CACHE_ENTRIES', '128')))
+PROMPT_MODES = ("full", "excerpt", "reference")
+promptMaxChars = int(os.getenv('PROMPT_MAX_CHARS', '50000'))
+promptExcerptChars = int(os.getenv('PROMPT_EXCERPT_CHARS', '4000'))
+
+# Regular expression search; corpora of GREP_PARALLEL_MIN_BYTES or more are
+# scanned in a pool of GREP_WORKERS processes (one per CPU by default)
+grep = ParallelGrep(
+    max_workers=int(os.getenv('GREP_WORKERS')) if os.getenv('GREP_WORKERS') else None,
+    parallel_min_bytes=int(os.getenv('GREP_PARALLEL_MIN_BYTES', str(4 * 1024 * 1024))),
+)
+
+# Worker mode: SERVER_WORKERS=N runs the CPU-bound work on documents (compute_numbers on a
+# document, grep_documents) in N processes, each holding a hash shard of the documents
+serverWorkers = int(os.getenv('SERVER_WORKERS', '0'))
+workers = ShardedWorkers(
+    serverWorkers,
+    cache_bytes=int(os.getenv('WORKER_CACHE_BYTES', str(256 * 1024 * 1024))),
+) if serverWorkers else None
+if workers is not None:
+    docs.add_listener(workers.changed)
+
+# Document read counts, saved across runs to pick the documents to preload
+accessStats = AccessStats(os.getenv('ACCESS_STATS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.access_stats.json')))
+
+# Background warm-up after startup (steps are added below the tools). WARMUP=0 disables it.
+warmUp = WarmUp(enabled=os.getenv('WARMUP', '1') != '0')
+
+# Event loop lag, checked every LOOP_LAG_INTERVAL seconds; stalls of LOOP_LAG_THRESHOLD
+# seconds or more are recorded with the request and stack that blocked the loop
+loopMonitor = LoopLagMonitor(
+    interval=float(os.getenv('LOOP_LAG_INTERVAL', '0.05')),
+    threshold=float(os.getenv('LOOP_LAG_THRESHOLD', '0.1')),
+)
+
+# On-demand sampling profiler behind the admin tools, which show server internals
+# and are only registered with ADMIN_TOOLS=1
+profiler = SamplingProfiler()
+adminTools = os.getenv('ADMIN_TOOLS', '0') == '1'
+
+@asynccontextmanager
+async def lifespan(server):
+    # Runs for every session under streamable HTTP: it only starts what is not running yet,
+    # and shutdown() stops things once the server exits. The warm-up runs as a background
+    # task, so the initialize handshake does not wait for it
+    replay.start()
+    warmUp.start()
+    loopMonitor.start()
+    yield
+
+def shutdown() -> None:
+    """Saves the access stats and stops the worker processes; called once when the server stops."""
+    accessStats.save()
+    grep.close()
+    if workers is not None:
+        workers.close()
+    if docs.source is not None:
+        docs.source.close()
+
 # STEP 1 : IMPORT FASTMCP using MCP SDK
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from mcp.server.fastmcp.prompts import base
 from pydantic import Field
 
-mcp = FastMCP("DocumentMCP", log_level="ERROR")
+mcp = FastMCP("DocumentMCP", log_level="ERROR", lifespan=lifespan)
+# With TRACE_FILE set, every request is recorded as a span (see tracing.py)
+instrument_server(mcp._mcp_server)
+loopMonitor.track(mcp._mcp_server)
 
 # STEP 2 : Define MCP Tools 
 # TOOL 1 : Creating a dodcument Reader tool
@@ -53,36 +254,136 @@ def document_reader(document_name: str) -> str:
         print(f"Document {document_name} not found.")
         raise ValueError(f"Document {document_name} not found.")
 
+    accessStats.record(document_name)
     return f"Document {document_name} content: {docs[document_name]}"
 
+# Writes and edits answer with a summary of the change unless response_mode="full",
+# so a small edit to a large document does not send the whole document back
+RESPONSE_MODES = ("summary", "full")
+EXCERPT_CONTEXT = 80
+MAX_EXCERPT = 2000
+
+def edit_summary(document_name: str, previous: str | None, text: str, version: int) -> dict:
+    """Describes a change by its location and an excerpt of the changed text with some context."""
+    start, old_end, new_end = changed_region(previous or "", text)
+    excerpt_start = max(0, start - EXCERPT_CONTEXT)
+    excerpt_end = min(len(text), new_end + EXCERPT_CONTEXT)
+    excerpt = text[excerpt_start:excerpt_end]
+    summary = {
+        "document_name": document_name,
+        "created": previous is None,
+        "version": version,
+        "length": len(text),
+        "change": {
+            "start": start,
+            "line": text.count("\n", 0, start) + 1,
+            "removed_chars": old_end - start,
+            "inserted_chars": new_end - start,
+            "excerpt_start": excerpt_start,
+            "excerpt": excerpt[:MAX_EXCERPT],
+        },
+    }
+    if len(excerpt) > MAX_EXCERPT:
+        summary["change"]["excerpt_truncated"] = True
+    return summary
+
+def check_response_mode(response_mode: str) -> None:
+    if response_mode not in RESPONSE_MODES:
+        raise ValueError(f"Unknown response_mode {response_mode}. Use one of: {', '.join(RESPONSE_MODES)}")
+
 # TOOL 2 : Creating a document writer tool
-@mcp.tool(name="document_writer", description="Writes content to a document")
-def document_writer(document_name: str, content: str) -> str:
+@mcp.tool(name="document_writer", description="Writes content to a document. Pass expected_version to only write if the document is still at that version. Returns a summary of the change; pass response_mode='full' to get the whole document back.")
+def document_writer(document_name: str, content: str, expected_version: int | None = None,
+                    response_mode: str = "summary") -> str | dict:
     """Writes content to a document."""
-    if document_name not in docs:
-        docs[document_name] = content
+    check_response_mode(response_mode)
+    previous, text, version = docs.modify(
+        document_name,
+        lambda previous: content if previous is None else previous + content,
+        expected_version,
+    )
+    if previous is None:
         print(f"Document {document_name} not found. So created a new document.")
     else:
-        docs[document_name] += content
         print(f"Document {document_name} found. So appended the content.")
-    return f"Document {document_name} content: {docs[document_name]}"
+    if response_mode == "summary":
+        return edit_summary(document_name, previous, text, version)
+    return f"Document {document_name} content: {text}"
 
 # TOOL 3 : Creating a document editor tool
-@mcp.tool(name="document_editor", description="Edits a document with the given content")
-def document_editor(document_name: str, old_content: str, new_content: str) -> str:
+@mcp.tool(name="document_editor", description="Edits a document with the given content. Pass expected_version to only edit if the document is still at that version. Returns a summary of the change; pass response_mode='full' to get the whole document back.")
+def document_editor(document_name: str, old_content: str, new_content: str, expected_version: int | None = None,
+                    response_mode: str = "summary") -> str | dict:
     """Edits a document with the given content."""
+    check_response_mode(response_mode)
     if document_name not in docs:
         print(f"Document {document_name} not found.")
         raise ValueError(f"Document {document_name} not found.")
-    if old_content not in docs[document_name]:
-        print(f"Old content not found in document {document_name}.")
-        raise ValueError(f"Old content not found in document {document_name}.")
-    print(f"Old content found in document {document_name}.")
-    docs[document_name] = docs[document_name].replace(old_content, new_content)
-    print(f"Document {document_name} content updated. New content: {docs[document_name]}")
-    return f"Document {document_name} content updated. New content: {docs[document_name]}"
-
-# TOOL 4 : Creating a number addition tool
+
+    def replace(previous: str | None) -> str:
+        # Checked under the document lock so no other edit can slip in between
+        if previous is None or old_content not in previous:
+            print(f"Old content not found in document {document_name}.")
+            raise ValueError(f"Old content not found in document {document_name}.")
+        print(f"Old content found in document {document_name}.")
+        return previous.replace(old_content, new_content)
+
+    previous, text, version = docs.modify(document_name, replace, expected_version)
+    if response_mode == "summary":
+        summary = edit_summary(document_name, previous, text, version)
+        summary["replacements"] = previous.count(old_content)
+        print(f"Document {document_name} content updated at line {summary['change']['line']}.")
+        return summary
+    print(f"Document {document_name} content updated. New content: {text}")
+    return f"Document {document_name} content updated. New content: {text}"
+
+# TOOL 4 : Reading the current version number of a document
+@mcp.tool(name="document_version", description="Gets the current version of a document for use as expected_version in conditional edits")
+def document_version(document_name: str) -> dict:
+    """Gets the current version of a document."""
+    if document_name not in docs:
+        raise ValueError(f"Document {document_name} not found.")
+    text, version = docs.snapshot(document_name)
+    return {"document_name": document_name, "version": version, "length": len(text)}
+
+# TOOL 5 : Listing the stored versions of a document
+@mcp.tool(name="list_document_versions", description="Lists the stored versions of a document")
+def list_document_versions(document_name: str) -> list[dict]:
+    """Lists the stored versions of a document, oldest first."""
+    ensure_history(document_name)
+    return history.list_versions(document_name)
+
+# TOOL 6 : Reading a past version of a document
+@mcp.tool(name="read_document_version", description="Reads a past version of a document")
+def read_document_version(document_name: str, version: int) -> str:
+    """Reads a past version of a document."""
+    ensure_history(document_name)
+    return history.get(document_name, version)
+
+# TOOL 7 : Diffing two versions of a document
+@mcp.tool(name="diff_document_versions", description="Shows a unified diff between two versions of a document")
+def diff_document_versions(document_name: str, from_version: int, to_version: int) -> str:
+    """Shows a unified diff between two versions of a document."""
+    ensure_history(document_name)
+    return history.diff(document_name, from_version, to_version)
+
+# TOOL 8 : Extracting a batch of file documents up front
+@mcp.tool(name="preload_documents", description="Extracts the text of file-backed documents in one parallel batch")
+async def preload_documents(document_names: list[str] | None = None) -> dict:
+    """Extracts the text of file-backed documents in one parallel batch."""
+    # Waiting for the extraction pool blocks, so it happens off the event loop
+    loaded = await asyncio.to_thread(docs.preload, document_names)
+    return {"loaded": loaded}
+
+# TOOL 9 : Reading size statistics of many documents at once
+@mcp.tool(name="get_document_stats", description="Gets size statistics (bytes, lines, approximate tokens, heading outline) of documents without their content")
+def get_document_stats(document_names: list[str] | None = None) -> list[dict]:
+    """Gets size statistics of the given documents, or of all documents."""
+    if document_names is None:
+        document_names = list(docs.keys())
+    return [stats.get(document_name) for document_name in document_names]
+
+# TOOL 10 : Creating a number addition tool
 @mcp.tool(name="add_numbers", description="Adds two given numbers and returns the result")
 def add_numbers(number1: float, number2: float) -> str:
     """Adds two given numbers and returns the result."""
@@ -90,9 +391,338 @@ def add_numbers(number1: float, number2: float) -> str:
     print(f"Adding {number1} + {number2} = {result}")
     return f"The sum of {number1} and {number2} is {result}"
 
+# TOOL 11 : Creating a vectorized arithmetic tool for arrays of numbers
+@mcp.tool(name="compute_numbers", description="Computes over an array of numbers in one call: sum, mean, min, max, std, count, percentiles, describe, element-wise add/subtract/multiply/divide/power, or dot. Numbers come inline or from a document holding CSV or separated numbers.")
+async def compute_numbers(
+    operation: str,
+    values: list[float] | None = None,
+    document_name: str | None = None,
+    column: str | None = None,
+    other: list[float] | float | None = None,
+    other_column: str | None = None,
+    percentiles: list[float] | None = None,
+) -> dict:
+    """Computes over an array of numbers in one vectorized pass.
+
+    Args:
+        operation (str): One of sum, mean, min, max, std, count, percentiles, describe,
+            add, subtract, multiply, divide, power or dot.
+        values (list[float]): The numbers, inline. Use this or document_name.
+        document_name (str): A document holding the numbers.
+        column (str): CSV column (header name or zero-based index) to read from the document.
+        other (list[float] | float): Second operand for element-wise operations and dot.
+        other_column (str): Read the second operand from another column of the same document.
+        percentiles (list[float]): Percentiles (0-100) for the percentiles and describe operations.
+
+    Returns:
+        dict: The operation and its numeric result.
+    """
+    if (values is None) == (document_name is None):
+        raise ValueError("Pass either values or document_name.")
+    if values is not None:
+        return bulk_math.compute(operation, np.asarray(values, dtype=np.float64), other, percentiles)
+    if document_name not in docs:
+        raise ValueError(f"Document {document_name} not found.")
+    if workers is not None:
+        # Parsed by the worker holding the document, which only needs its text once per change
+        return await workers.run_on_document(document_name, docs.__getitem__, bulk_math.compute_text,
+                                             operation, column, other, other_column, percentiles)
+    return bulk_math.compute_text(docs[document_name], operation, column, other, other_column, percentiles)
+
+# TOOL 12 : Searching documents with a regular expression
+@mcp.tool(name="grep_documents", description="Finds matches of a regular expression across documents, with line numbers, columns and offsets. Matches are streamed as log notifications while the search runs; max_matches caps the total.")
+async def grep_documents(
+    pattern: str,
+    document_names: list[str] | None = None,
+    namespace: str | None = None,
+    ignore_case: bool = False,
+    max_matches: int = 100,
+    ctx: Context = None,
+) -> dict:
+    """Finds matches of a regular expression across documents.
+
+    Args:
+        pattern (str): A Python regular expression; ^ and $ match at line breaks.
+        document_names (list[str]): Documents to search. All documents by default.
+        namespace (str): Only search the documents of this namespace.
+        ignore_case (bool): Match case-insensitively.
+        max_matches (int): Stop after this many matches.
+
+    Returns:
+        dict: The matches with document name, line, column, offset, matched text and line text.
+    """
+    if max_matches < 1:
+        raise ValueError("max_matches must be at least 1.")
+    names = document_names if document_names is not None else sorted(docs.keys())
+    if namespace is not None:
+        names = [name for name in names if namespace_of(name) == namespace]
+    for name in names:
+        if name not in docs:
+            raise ValueError(f"Document {name} not found.")
+
+    # One match past max_matches is searched for, to tell whether the results were cut short
+    if workers is not None:
+        # The workers scan the documents they hold; only texts they lack are read and sent
+        search = grep.search_workers(workers, pattern, names, docs.peek, ignore_case, max_matches + 1)
+    else:
+        search = grep.search(pattern, names, docs.peek, ignore_case, max_matches + 1)
+    found, truncated = [], False
+    async for done, matches in search:
+        if len(found) + len(matches) > max_matches:
+            matches, truncated = matches[:max_matches - len(found)], True
+        if matches:
+            found.extend(matches)
+            await send_log(ctx, "grep_documents", {"matches": matches})
+        await report_progress(ctx, done, len(names))
+    return {
+        "pattern": pattern,
+        "documents_searched": len(names),
+        "matches": found,
+        "truncated": truncated,
+    }
+
+async def send_log(ctx: Context | None, logger: str, data) -> None:
+    """Sends JSON data as a log notification tied to the current request, if there is one."""
+    try:
+        session = ctx.request_context.session
+    except (AttributeError, ValueError):
+        # Called outside a client request, e.g. from a benchmark
+        return
+    await session.send_log_message(level="info", data=data, logger=logger, related_request_id=ctx.request_id)
+
+async def report_progress(ctx: Context | None, progress: float, total: float | None = None) -> None:
+    try:
+        await ctx.report_progress(progress, total)
+    except (AttributeError, ValueError):
+        pass
+
+# Bulk import and export read and write files inside BULK_DIR (the working directory by default)
+bulkDir = os.path.realpath(os.getenv('BULK_DIR', '.'))
+IMPORT_BATCH = 500
+MAX_REPORTED_ERRORS = 100
+EXPORT_CHUNK_BYTES = 1024 * 1024
+
+def bulk_path(path: str) -> str:
+    resolved = os.path.realpath(os.path.join(bulkDir, path))
+    if os.path.commonpath([resolved, bulkDir]) != bulkDir:
+        raise ValueError(f"Path {path} is outside BULK_DIR.")
+    return resolved
+
+# TOOL 13 : Importing many documents in one call
+@mcp.tool(name="import_documents", description="Imports many documents in one call from NDJSON ({\"document_name\": ..., \"content\": ...} per line) or a tar archive, read from a file or passed inline. Per-document statuses are streamed as log notifications and can be saved to status_path; the result counts them and lists the first errors.")
+async def import_documents(
+    path: str | None = None,
+    # Plain str: FastMCP would parse a single NDJSON line into a dict for any other annotation
+    data: str = "",
+    format: str | None = None,
+    mode: str = "replace",
+    namespace: str | None = None,
+    status_path: str | None = None,
+    ctx: Context = None,
+) -> dict:
+    """Imports many documents from NDJSON or a tar archive, one document at a time.
+
+    Args:
+        path (str): File to import, relative to BULK_DIR. Use this or data.
+        data (str): Inline NDJSON text, or a base64 encoded tar archive with format='tar'.
+        format (str): 'ndjson' or 'tar'. Guessed from the file extension by default.
+        mode (str): 'replace' existing documents, 'append' to them, or only 'create' new ones.
+        namespace (str): Import the documents into this namespace.
+        status_path (str): Also write every document's status as NDJSON to this file, relative to BULK_DIR.
+
+    Returns:
+        dict: Counts of created, updated and failed documents, the first errors and the throughput.
+    """
+    if (path is None) == (not data):
+        raise ValueError("Pass either path or data.")
+    if mode not in IMPORT_MODES:
+        raise ValueError(f"Unknown mode {mode}. Use one of: {', '.join(IMPORT_MODES)}")
+    format = detect_format(path, format)
+    status_file_path = bulk_path(status_path) if status_path else None
+    # Open the input before the status file, so a bad input leaves no half-written status file behind
+    if path is not None:
+        try:
+            source = open(bulk_path(path), "rb")
+        except OSError as e:
+            raise ValueError(f"Could not open {path}: {e.strerror}")
+    elif format == "tar":
+        try:
+            source = io.BytesIO(base64.b64decode(data, validate=True))
+        except ValueError as e:
+            raise ValueError(f"data is not valid base64: {e}")
+    else:
+        source = io.StringIO(data)
+    items = read_tar(source) if format == "tar" else read_ndjson(source)
+    status_file = None
+
+    def import_batch() -> list[dict]:
+        statuses = []
+        for item, document_name, content, error in itertools.islice(items, IMPORT_BATCH):
+            if error is None:
+                if namespace is not None:
+                    document_name = f"{namespace}:{document_name}"
+                try:
+                    status = import_document(docs, document_name, content, mode)
+                except ValueError as e:
+                    error = str(e)
+            if error is not None:
+                status = {"document_name": document_name, "status": "failed", "error": error}
+            statuses.append({"item": item, **status})
+        if status_file:
+            status_file.writelines(json.dumps(status) + "\n" for status in statuses)
+        return statuses
+
+    counts = {"created": 0, "updated": 0, "failed": 0}
+    errors = []
+    started = time.perf_counter()
+    try:
+        if status_file_path:
+            try:
+                status_file = open(status_file_path, "w", encoding="utf-8")
+            except OSError as e:
+                raise ValueError(f"Could not open {status_path}: {e.strerror}")
+        while True:
+            try:
+                statuses = await asyncio.to_thread(import_batch)
+            except (tarfile.TarError, EOFError, OSError) as e:
+                raise ValueError(f"Could not read {format} input after {sum(counts.values())} documents: {e}")
+            if not statuses:
+                break
+            for status in statuses:
+                counts[status["status"]] += 1
+                if status["status"] == "failed" and len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append(status)
+            await send_log(ctx, "import_documents", {"statuses": statuses})
+            await report_progress(ctx, sum(counts.values()))
+    finally:
+        items.close()
+        source.close()
+        if status_file:
+            status_file.close()
+    seconds = time.perf_counter() - started
+    return {
+        "format": format,
+        "documents": sum(counts.values()),
+        **counts,
+        "errors": errors,
+        "seconds": round(seconds, 3),
+        "documents_per_second": round(sum(counts.values()) / seconds, 1) if seconds else None,
+    }
+
+# TOOL 14 : Exporting documents as NDJSON or a tar archive
+@mcp.tool(name="export_documents", description="Exports all documents, or those of a namespace, matching a name pattern or listed, as NDJSON or a tar archive written to path. Without path the documents are streamed to the client as log notifications of about 1 MB each.")
+async def export_documents(
+    path: str | None = None,
+    format: str | None = None,
+    namespace: str | None = None,
+    name_pattern: str | None = None,
+    document_names: list[str] | None = None,
+    ctx: Context = None,
+) -> dict:
+    """Exports documents one at a time to a file or to the client.
+
+    Args:
+        path (str): File to write, relative to BULK_DIR. A .gz, .bz2 or .xz tar archive is compressed.
+        format (str): 'ndjson' or 'tar'. Guessed from the file extension by default.
+        namespace (str): Only export the documents of this namespace.
+        name_pattern (str): Only export documents whose names match this glob pattern (e.g. 'team-a:*.md').
+        document_names (list[str]): Only export these documents.
+
+    Returns:
+        dict: The number of documents and bytes exported.
+    """
+    format = detect_format(path, format)
+    if path is None and format == "tar":
+        raise ValueError("A tar archive can only be exported to a path.")
+    names = document_names if document_names is not None else sorted(docs.keys())
+    if namespace is not None:
+        names = [name for name in names if namespace_of(name) == namespace]
+    if name_pattern is not None:
+        names = [name for name in names if fnmatch.fnmatchcase(name, name_pattern)]
+
+    exported = {"documents": 0, "characters": 0, "missing": []}
+
+    def read(name: str) -> tuple[str, int] | None:
+        try:
+            text, version = read_document(docs, name)
+        except KeyError:
+            # Deleted since it was listed, or never existed
+            exported["missing"].append(name)
+            return None
+        exported["documents"] += 1
+        exported["characters"] += len(text)
+        return text, version
+
+    def export_to_file(target: str) -> None:
+        # Written next to the target and renamed at the end, so readers never see a partial file
+        partial = target + ".partial"
+        with open(partial, "wb") as output:
+            writer = TarWriter(output, target) if format == "tar" else None
+            for name in names:
+                document = read(name)
+                if document is None:
+                    continue
+                if writer:
+                    writer.add(name, *document)
+                else:
+                    output.write(ndjson_record(name, *document))
+            if writer:
+                writer.close()
+        os.replace(partial, target)
+
+    if path is not None:
+        await asyncio.to_thread(export_to_file, bulk_path(path))
+        return {"path": path, "format": format, **exported}
+
+    chunk, size = [], 0
+    for done, name in enumerate(names, 1):
+        document = await asyncio.to_thread(read, name)
+        if document is not None:
+            text, version = document
+            chunk.append({"document_name": name, "version": version, "content": text})
+            size += len(text)
+        if chunk and (size >= EXPORT_CHUNK_BYTES or done == len(names)):
+            await send_log(ctx, "export_documents", {"documents": chunk})
+            await report_progress(ctx, done, len(names))
+            chunk, size = [], 0
+    return {"format": format, **exported}
+
+# Admin tools: profiling the running server
+if adminTools:
+    # TOOL 15 : Profiling the server for a number of seconds
+    @mcp.tool(name="profile_server", description="Samples the stacks of all server threads for the given number of seconds and returns them in the collapsed format read by flamegraph.pl, inferno and speedscope. Requests keep being served meanwhile.")
+    async def profile_server(seconds: float = 5.0, interval_ms: float = 10.0, max_stacks: int = 200) -> dict:
+        """Profiles the server while other requests run.
+
+        Args:
+            seconds: How long to sample.
+            interval_ms: Time between samples.
+            max_stacks: Most frequent stacks to return; the result says when others were left out.
+
+        Returns:
+            samples, seconds and the profile as "thread;outer;...;inner count" lines under collapsed.
+        """
+        profiler.start(interval_ms / 1000, max_seconds=seconds)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            result = profiler.stop(max_stacks)
+        return result
+
+    # TOOL 16 : Starting the profiler in the background
+    @mcp.tool(name="start_profiler", description="Starts sampling the stacks of all server threads until stop_profiler is called or max_seconds have passed")
+    def start_profiler(interval_ms: float = 10.0, max_seconds: float = 300.0) -> dict:
+        profiler.start(interval_ms / 1000, max_seconds=max_seconds)
+        return {"running": True, "interval_ms": interval_ms, "max_seconds": max_seconds}
+
+    # TOOL 17 : Stopping the profiler and getting the profile
+    @mcp.tool(name="stop_profiler", description="Stops the profiler started with start_profiler and returns the most frequent stacks in the collapsed (flamegraph) format")
+    def stop_profiler(max_stacks: int = 200) -> dict:
+        return profiler.stop(max_stacks)
+
 
 @mcp.tool(name="get_temperature", description="Gets the current temperature for a given city")
-def get_temperature(city: str) -> dict:
+async def get_temperature(city: str) -> dict:
     """Gets the current temperature for a given city.
 
     Args:
@@ -102,16 +732,23 @@ def get_temperature(city: str) -> dict:
         dict: A dictionary containing the temperature data or an error message.
     """
     print("Entered the method / function get_temperature");
-    weatherAPIUrl = "http://api.weatherapi.com/v1/current.json?key=" + weatherAPIKey + "&q=" + city;
+    return await upstreams["weatherapi"].call(city.lower(), fetch_temperature, city)
+
+def fetch_temperature(city: str, timeout: float | None = None) -> dict:
+    weatherAPIUrl = replay.base_url("weatherapi", weatherAPIBaseUrl) + "/current.json?key=" + weatherAPIKey + "&q=" + city;
     print(weatherAPIUrl)
-    response = requests.get(weatherAPIUrl)
+    with tracer.span("weatherapi GET /current.json", city=city) as span:
+        response = requests.get(weatherAPIUrl, timeout=timeout)
+        span.set(status=response.status_code)
+    check_response(response)
     data = response.json()
+    replay.record_response("weatherapi", response, data)
     print(data)
     return data
 
 @mcp.tool(name="get_currency_exchange_rates", description="Gets the currency exchange rates for a given currency")
 # Function to get currency exchange rates
-def get_currency_exchange_rates(currency: str) -> dict:
+async def get_currency_exchange_rates(currency: str) -> dict:
     """Gets the currency exchange rates for a given currency.
 
     Args:
@@ -121,17 +758,24 @@ def get_currency_exchange_rates(currency: str) -> dict:
         dict: A dictionary containing the exchange rate data.
     """
     print("Entered the method / function get_currency_exchange_rates");
+    return await upstreams["exchangerate"].call(currency.upper(), fetch_currency_exchange_rates, currency)
+
+def fetch_currency_exchange_rates(currency: str, timeout: float | None = None) -> dict:
     # Where USD is the base currency you want to use
-    url = 'https://v6.exchangerate-api.com/v6/6f9f5f76947ce2150d20b85c/latest/' + currency + "/"
+    url = replay.base_url("exchangerate", exchangeRateAPIBaseUrl) + '/latest/' + currency + "/"
 
     # Making our request
-    response = requests.get(url)
+    with tracer.span("exchangerate GET /latest", currency=currency) as span:
+        response = requests.get(url, timeout=timeout)
+        span.set(status=response.status_code)
+    check_response(response)
     data = response.json()
+    replay.record_response("exchangerate", response, data)
     return data
 
 @mcp.tool(name="get_stock_price", description="Gets the stock price for a given ticker symbol")
 # Function to Get Stock Price
-def get_stock_price(ticker: str) -> dict:
+async def get_stock_price(ticker: str) -> dict:
     """Gets the stock price for a given ticker symbol.
 
     Args:
@@ -142,12 +786,143 @@ def get_stock_price(ticker: str) -> dict:
     """
     print("Entered the method / function get_stock_price");
     print(ticker)
+    return await upstreams["yahoo"].call(ticker.upper(), fetch_stock_price, ticker)
+
+def fetch_stock_price(ticker: str, timeout: float | None = None) -> dict:
+    if replay.replaying:
+        with tracer.span("yahoo replay GET", ticker=ticker):
+            response = requests.get(replay.base_url("yahoo") + "/" + ticker, timeout=timeout)
+        check_response(response)
+        return response.json()
     stock = yf.Ticker(ticker)
-    hist = stock.history(period="1d")
-    if not hist.empty:
-        return {"price": str(hist['Close'].iloc[-1])}
+    with tracer.span("yfinance history", ticker=ticker, period="1d"):
+        try:
+            hist = stock.history(period="1d", timeout=timeout or 10, **yahooHistoryOptions)
+        except YFTickerMissingError:
+            raise ValueError(f"No price data available for {ticker}.")
+    if hist.empty:
+        # yfinance logs network failures and returns an empty frame instead of raising
+        raise UpstreamError(f"yahoo returned no price for {ticker}.")
+    result = {"price": str(hist['Close'].iloc[-1])}
+    replay.record("yahoo", "/" + ticker, 200, result)
+    return result
+
+@mcp.tool(name="get_price_history", description="Gets daily closing prices and indicators (returns, moving average, volatility, drawdown) for one or more tickers as compact arrays")
+async def get_price_history(
+    tickers: list[str],
+    days: int = 365,
+    window: int = 20,
+    indicators: list[str] | None = None,
+    include_ohlcv: bool = False,
+) -> dict:
+    """Gets daily price history and indicators for one or more tickers.
+
+    Args:
+        tickers (list[str]): The stock ticker symbols (e.g., ['AAPL', 'MSFT']).
+        days (int): How many calendar days of history to return.
+        window (int): Window in trading days for the moving average and volatility.
+        indicators (list[str]): Any of 'returns', 'sma', 'volatility', 'drawdown'. All by default.
+        include_ohlcv (bool): Also return open, high, low and volume.
+
+    Returns:
+        dict: Dates plus one array per ticker for every field and indicator, aligned on the dates.
+    """
+    if days < 1:
+        raise ValueError("days must be at least 1.")
+    if window < 1:
+        raise ValueError("window must be at least 1.")
+    tickers = [check_ticker(ticker) for ticker in tickers]
+    end = date.today()
+    start = end - timedelta(days=days)
+    fetched = await asyncio.gather(*(price_history(ticker, start, end) for ticker in tickers))
+    series = dict(zip(tickers, fetched))
+
+    dates, close = align(series, "close")
+    computed = compute_indicators(close, window)
+    wanted = indicators or ["returns", "sma", "volatility", "drawdown"]
+    result = {
+        "tickers": tickers,
+        "dates": [from_day(day).isoformat() for day in dates],
+        "close": to_json_array(close),
+        "indicators": {
+            name: to_json_array(values)
+            for name, values in computed.items()
+            if values.ndim == 2 and name.split("_")[0] in wanted
+        },
+        "total_return": to_json_array(computed["total_return"]),
+        "max_drawdown": to_json_array(computed["max_drawdown"]),
+    }
+    if include_ohlcv:
+        for field in ("open", "high", "low", "volume"):
+            result[field] = to_json_array(align(series, field)[1])
+    return result
+
+async def price_history(ticker: str, start: date, end: date) -> dict:
+    # Series already on disk cost no admission token; only real fetches go through the upstream
+    series = await asyncio.to_thread(priceCache.cached, ticker, start, end)
+    if series is not None:
+        return series
+    return await upstreams["yahoo"].call(("history", ticker, start, end), load_price_history, ticker, start, end)
+
+def load_price_history(ticker: str, start: date, end: date, timeout: float | None = None) -> dict:
+    return priceCache.get(ticker, start, end, lambda t, s, e: fetch_price_history(t, s, e, timeout))
+
+def fetch_price_history(ticker: str, start: date, end: date, timeout: float | None = None) -> dict:
+    path = f"/history/{ticker}"
+    params = {"start": start.isoformat(), "end": end.isoformat()}
+    if replay.replaying:
+        with tracer.span("yahoo replay GET", ticker=ticker, start=params["start"], end=params["end"]):
+            response = requests.get(replay.base_url("yahoo") + path, params=params, timeout=timeout)
+        check_response(response)
+        body = response.json()
+        series = {"dates": np.array(body["dates"], dtype=np.int64)}
+        for field in FIELDS:
+            series[field] = np.array(body[field], dtype=np.float64)
+        return series
+    # yfinance treats `end` as exclusive
+    with tracer.span("yfinance history", ticker=ticker, start=start.isoformat(), end=end.isoformat()):
+        try:
+            hist = yf.Ticker(ticker).history(start=start, end=end + timedelta(days=1), interval="1d",
+                                             timeout=timeout or 10, **yahooHistoryOptions)
+        except YFTickerMissingError:
+            # Yahoo answered that there are no rows, e.g. for dates before a listing
+            hist = None
+    if hist is not None and hist.empty and np.busday_count(start, min(end, date.today())) > 0:
+        # An empty frame without an error is a failure that was not raised; it must not
+        # mark the range as checked
+        raise UpstreamError(f"yahoo returned no prices for {ticker} from {start} to {end}.")
+    if hist is None or hist.empty:
+        dates = np.empty(0, dtype=np.int64)
     else:
-        return {"error": "No data available"}
+        dates = hist.index.tz_localize(None).values.astype("datetime64[D]").astype(np.int64)
+    series = {"dates": dates}
+    for field in ("Open", "High", "Low", "Close", "Volume"):
+        series[field.lower()] = hist[field].to_numpy(dtype=np.float64) if dates.size else np.empty(0)
+    replay.record("yahoo", path + "?" + urlencode(params), 200, {name: values.tolist() for name, values in series.items()})
+    return series
+
+# Warm-up steps: prefetch the watchlists into the upstream caches and preload
+# the documents read most in earlier runs. Watchlists are comma separated,
+# e.g. WARMUP_TICKERS=AAPL,MSFT WARMUP_CURRENCIES=USD,EUR WARMUP_CITIES=London
+def watchlist(name: str) -> list[str]:
+    return [item.strip() for item in os.getenv(name, '').split(',') if item.strip()]
+
+for ticker in watchlist('WARMUP_TICKERS'):
+    warmUp.add(f"stock:{ticker}", lambda ticker=ticker: get_stock_price(ticker))
+for currency in watchlist('WARMUP_CURRENCIES'):
+    warmUp.add(f"currency:{currency}", lambda currency=currency: get_currency_exchange_rates(currency))
+for city in watchlist('WARMUP_CITIES'):
+    warmUp.add(f"temperature:{city}", lambda city=city: get_temperature(city))
+
+async def preload_hot_documents():
+    hot = [name for name in accessStats.hottest(int(os.getenv('WARMUP_DOCUMENTS', '20'))) if name in docs]
+    await asyncio.to_thread(docs.preload, hot)
+    for name in hot:
+        await asyncio.to_thread(stats.get, name)
+
+warmUp.add("documents", preload_hot_documents)
+if workers is not None:
+    warmUp.add("workers", workers.start)
 
 # STEP 3 : Define RESOUCES.
 @mcp.resource(
@@ -165,28 +940,97 @@ def read_doc(document_name: str) -> str:
     if document_name not in docs:
         print(f"Document {document_name} not found.")
         raise ValueError(f"Document {document_name} not found.")
+    accessStats.record(document_name)
     return docs[document_name]
 
+@mcp.resource(
+    "docs://namespaces",
+    mime_type="application/json"
+)
+def list_namespaces() -> dict:
+    return {"namespaces": docs.usage(), "memory": docs.memory()}
+
+@mcp.resource(
+    "docs://namespaces/{namespace}",
+    mime_type="application/json"
+)
+def list_namespace_docs(namespace: str) -> list[str]:
+    return [name for name in docs.keys() if namespace_of(name) == namespace]
+
+@mcp.resource(
+    "metrics://upstreams",
+    mime_type="application/json"
+)
+def upstream_metrics() -> dict:
+    return {name: upstream.metrics() for name, upstream in upstreams.items()}
+
+@mcp.resource(
+    "docs://documents/{document_name}/stats",
+    mime_type="application/json"
+)
+def read_doc_stats(document_name: str) -> dict:
+    return stats.get(document_name)
+
+@mcp.resource(
+    "status://warmup",
+    mime_type="application/json"
+)
+def warm_up_status() -> dict:
+    return warmUp.progress()
+
+@mcp.resource(
+    "metrics://event-loop",
+    mime_type="application/json"
+)
+def event_loop_metrics() -> dict:
+    # Stall stacks show server internals, like the admin tools
+    return loopMonitor.metrics(include_stacks=adminTools)
+
 
 # STEP 4 - DEFINE PROMPTS
 @mcp.prompt(
     name="format_doc_prompt",
-    description="Rewrites the contents of the document in Markdown format."
+    description="Rewrites the contents of the document in Markdown format. The document is included in the prompt (mode 'full', or its beginning and end with 'excerpt'); mode 'reference' only names it."
 )
 def format_document(
-    doc_id: str = Field(description="Id of the document to format")
+    doc_id: str = Field(description="Id of the document to format"),
+    mode: str = Field(default="full", description="full, excerpt or reference: how much of the document to include"),
+    max_chars: int | None = Field(default=None, description="Most characters of the document to include"),
 ) -> list[base.Message]:
     """Rewrites the contents of the document in Markdown format."""
-    prompt = f"""
-Your goal is to reformat a document to be written with markdown syntax.
+    if mode not in PROMPT_MODES:
+        raise ValueError(f"Unknown mode {mode}. Use one of: {', '.join(PROMPT_MODES)}")
+    if max_chars is None:
+        max_chars = promptExcerptChars if mode == "excerpt" else promptMaxChars
+    if max_chars < 1:
+        raise ValueError("max_chars must be at least 1.")
+    # A reference needs only the version, so the document is not read (or decompressed)
+    return prompts.render(doc_id, (mode, max_chars), lambda text, version: render_format_document(doc_id, text, version, mode, max_chars),
+                          needs_text=mode != "reference")
 
-The id of the document you need to reformat is:
+def render_format_document(doc_id: str, text: str | None, version: int, mode: str, max_chars: int) -> list[base.Message]:
+    if mode == "reference":
+        document = f"""The id of the document you need to reformat is:
 <document_id>
 {doc_id}
-</document_id>
+</document_id>"""
+    else:
+        content, omitted = excerpt(text, max_chars)
+        note = ""
+        if omitted:
+            note = (f"\nOnly part of the document is shown: {omitted} of its {len(text)} characters are left out. "
+                    f"Read it with the 'document_reader' tool before changing the parts that are not shown.")
+        document = f"""The document you need to reformat is {doc_id}, at version {version}:
+<document id="{doc_id}" version="{version}">
+{content}
+</document>{note}"""
+    prompt = f"""
+Your goal is to reformat a document to be written with markdown syntax.
+
+{document}
 
 Add in headers, bullet points, tables, etc as necessary. Feel free to add in structure.
-Use the 'edit_document' tool to edit the document. After the document has been reformatted...
+Use the 'document_editor' tool to edit the document (pass expected_version={version} on the first edit so it fails if the document changed in the meantime). After the document has been reformatted...
 """
     
     return [
@@ -194,7 +1038,15 @@ Use the 'edit_document' tool to edit the document. After the document has been r
     ]
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    # MCP_TRANSPORT=streamable-http serves on http://127.0.0.1:<MCP_PORT>/mcp
+    mcp.settings.port = int(os.getenv("MCP_PORT", "8000"))
+    # From process start (after the interpreter is up) to serving; the time before that shows up as
+    # the gap after the client's spawn in the trace
+    tracer.record("server startup", startTime, parent=os.getenv("TRACEPARENT"))
+    try:
+        mcp.run(transport=os.getenv("MCP_TRANSPORT", "stdio"))
+    finally:
+        shutdown()
     #This starts a development server and gives you a local URL, 
     # typically something like http://127.0.0.1:6274. 
     # Open this URL in your browser to access the MCP Inspector.
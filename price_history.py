@@ -0,0 +1,215 @@
+# Daily OHLCV price history with an on-disk cache and vectorized indicators.
+#
+# Each ticker's series is cached as a compressed .npz file of column arrays
+# (dates as days since the epoch plus one float array per field). Only the
+# date ranges that have not been checked before are fetched, and indicators
+# are computed with NumPy over a (tickers x dates) matrix in one pass.
+
+import os
+import re
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+FIELDS = ("open", "high", "low", "close", "volume")
+TRADING_DAYS_PER_YEAR = 252
+EPOCH = date(1970, 1, 1)
+# Ticker symbols as Yahoo Finance writes them, e.g. BRK-B, ^GSPC, EURUSD=X, 7203.T
+TICKER_PATTERN = re.compile(r"^[A-Z0-9.^=-]{1,15}$")
+
+
+def check_ticker(ticker: str) -> str:
+    """Returns the upper-cased ticker, or raises ValueError if it is not a valid symbol."""
+    symbol = ticker.strip().upper()
+    if not TICKER_PATTERN.match(symbol):
+        raise ValueError(f"Invalid ticker symbol {ticker!r}.")
+    return symbol
+
+
+def to_day(d: date) -> int:
+    return (d - EPOCH).days
+
+
+def from_day(day: int) -> date:
+    return EPOCH + timedelta(days=int(day))
+
+
+def empty_series() -> dict:
+    series = {"dates": np.empty(0, dtype=np.int64)}
+    for field in FIELDS:
+        series[field] = np.empty(0, dtype=np.float64)
+    return series
+
+
+def merge_series(old: dict, new: dict) -> dict:
+    """Merges two series by date; rows from `new` win on the same date."""
+    dates = np.concatenate([new["dates"], old["dates"]])
+    # np.unique keeps the first occurrence, which is the row from `new`
+    dates, index = np.unique(dates, return_index=True)
+    merged = {"dates": dates}
+    for field in FIELDS:
+        merged[field] = np.concatenate([new[field], old[field]])[index]
+    return merged
+
+
+class PriceHistoryCache:
+    """Per-ticker OHLCV series cached on disk as .npz column arrays.
+
+    Besides the rows, each file remembers the range of days already asked
+    for (`checked_from`..`checked_until`), so weekends, holidays and dates
+    before a listing are not fetched again.
+    """
+
+    def __init__(self, cache_dir: str):
+        self.cache_dir = cache_dir
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.cache_dir, f"{check_ticker(ticker)}.npz")
+
+    def _lock(self, ticker: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(ticker.upper(), threading.Lock())
+
+    def load(self, ticker: str) -> tuple[dict, int, int] | None:
+        try:
+            with np.load(self._path(ticker)) as data:
+                series = {name: data[name] for name in ("dates",) + FIELDS}
+                return series, int(data["checked_from"]), int(data["checked_until"])
+        except FileNotFoundError:
+            return None
+
+    def cached(self, ticker: str, start: date, end: date) -> dict | None:
+        """Returns the series for `start`..`end` from disk, or None if part of it was never fetched.
+
+        Days up to yesterday must have been checked. Today is served as far as
+        it is on disk: until the next day's first fetch, yesterday's close
+        stands for today.
+        """
+        cached = self.load(ticker)
+        if cached is None:
+            return None
+        series, checked_from, checked_until = cached
+        start_day, end_day = to_day(start), to_day(end)
+        if start_day < checked_from or min(end_day, to_day(date.today()) - 1) > checked_until:
+            return None
+        keep = (series["dates"] >= start_day) & (series["dates"] <= end_day)
+        return {name: values[keep] for name, values in series.items()}
+
+    def save(self, ticker: str, series: dict, checked_from: int, checked_until: int) -> None:
+        tmp_path = self._path(ticker) + ".tmp.npz"
+        np.savez_compressed(tmp_path, checked_from=checked_from, checked_until=checked_until, **series)
+        os.replace(tmp_path, self._path(ticker))
+
+    def get(self, ticker: str, start: date, end: date, fetch) -> dict:
+        """Returns the series for `start`..`end`, fetching only ranges not checked before.
+
+        `fetch(ticker, start, end)` returns a series dict for the inclusive
+        date range. Today's bar is never marked as checked because it can
+        still change.
+        """
+        start_day, end_day = to_day(start), to_day(end)
+        with self._lock(ticker):
+            cached = self.load(ticker)
+            if cached is None:
+                series, checked_from, checked_until = empty_series(), start_day, start_day - 1
+            else:
+                series, checked_from, checked_until = cached
+
+            changed = False
+            if start_day < checked_from:
+                series = merge_series(series, fetch(ticker, start, from_day(checked_from - 1)))
+                checked_from, changed = start_day, True
+            if end_day > checked_until:
+                series = merge_series(series, fetch(ticker, from_day(checked_until + 1), end))
+                checked_until = min(end_day, to_day(date.today()) - 1)
+                changed = True
+            if changed:
+                self.save(ticker, series, checked_from, checked_until)
+
+        keep = (series["dates"] >= start_day) & (series["dates"] <= end_day)
+        return {name: values[keep] for name, values in series.items()}
+
+
+def align(series_by_ticker: dict[str, dict], field: str = "close") -> tuple[np.ndarray, np.ndarray]:
+    """Aligns one field of several series on the union of their dates.
+
+    Returns the dates and a (tickers x dates) matrix with NaN where a ticker
+    has no row for a date.
+    """
+    all_dates = np.unique(np.concatenate([s["dates"] for s in series_by_ticker.values()] or [np.empty(0, np.int64)]))
+    matrix = np.full((len(series_by_ticker), len(all_dates)), np.nan)
+    for row, series in enumerate(series_by_ticker.values()):
+        matrix[row, np.searchsorted(all_dates, series["dates"])] = series[field]
+    return all_dates, matrix
+
+
+def forward_fill(matrix: np.ndarray) -> np.ndarray:
+    """Fills gaps (e.g. another market's holidays) with the last known value in each row."""
+    valid = ~np.isnan(matrix)
+    index = np.where(valid, np.arange(matrix.shape[1]), 0)
+    np.maximum.accumulate(index, axis=1, out=index)
+    filled = matrix[np.arange(matrix.shape[0])[:, None], index]
+    # Before a row's first value there is nothing to fill with
+    filled[~np.logical_or.accumulate(valid, axis=1)] = np.nan
+    return filled
+
+
+def rolling_mean(matrix: np.ndarray, window: int) -> np.ndarray:
+    """Rolling mean along each row; NaN until `window` valid values are in the window."""
+    valid = ~np.isnan(matrix)
+    sums = np.cumsum(np.where(valid, matrix, 0.0), axis=1)
+    counts = np.cumsum(valid, axis=1)
+    sums = np.concatenate([np.zeros((matrix.shape[0], 1)), sums], axis=1)
+    counts = np.concatenate([np.zeros((matrix.shape[0], 1), dtype=counts.dtype), counts], axis=1)
+    result = np.full(matrix.shape, np.nan)
+    if window <= matrix.shape[1]:
+        window_sums = sums[:, window:] - sums[:, :-window]
+        window_counts = counts[:, window:] - counts[:, :-window]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result[:, window - 1:] = np.where(window_counts == window, window_sums / window, np.nan)
+    return result
+
+
+def compute_indicators(close: np.ndarray, window: int = 20) -> dict[str, np.ndarray]:
+    """Computes indicators for a (tickers x dates) matrix of closing prices."""
+    close = forward_fill(close)
+    returns = np.full(close.shape, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        returns[:, 1:] = close[:, 1:] / close[:, :-1] - 1.0
+
+    mean = rolling_mean(returns, window)
+    mean_of_squares = rolling_mean(returns * returns, window)
+    variance = np.maximum(mean_of_squares - mean * mean, 0.0) * window / max(window - 1, 1)
+    volatility = np.sqrt(variance) * np.sqrt(TRADING_DAYS_PER_YEAR)
+
+    running_max = np.fmax.accumulate(close, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        drawdown = close / running_max - 1.0
+
+    if close.shape[1]:
+        first = np.take_along_axis(close, np.argmax(~np.isnan(close), axis=1)[:, None], axis=1)[:, 0]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            total_return = close[:, -1] / first - 1.0
+        max_drawdown = np.min(np.where(np.isnan(drawdown), np.inf, drawdown), axis=1)
+        max_drawdown[np.isinf(max_drawdown)] = np.nan
+    else:
+        total_return = np.full(close.shape[0], np.nan)
+        max_drawdown = np.full(close.shape[0], np.nan)
+    return {
+        "returns": returns,
+        f"sma_{window}": rolling_mean(close, window),
+        f"volatility_{window}": volatility,
+        "drawdown": drawdown,
+        "total_return": total_return,
+        "max_drawdown": max_drawdown,
+    }
+
+
+def to_json_array(values: np.ndarray, decimals: int = 6) -> list:
+    """Converts an array to nested lists with NaN as None."""
+    rounded = np.round(values.astype(np.float64), decimals)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
@@ -0,0 +1,223 @@
+# Diagnostics for a running server: an on-demand sampling profiler and an
+# event loop lag monitor.
+#
+# SamplingProfiler takes the stack of every thread at a fixed interval from
+# a background thread (sys._current_frames), so it needs no instrumentation
+# and profiles whatever the server is doing, including code that blocks the
+# event loop. Stacks are counted in the collapsed ("folded") format:
+#
+#   MainThread;run (server.py:10);handle (server.py:42) 17
+#
+# which flamegraph.pl, inferno and https://www.speedscope.app read directly.
+#
+# LoopLagMonitor wakes up every `interval` seconds on the event loop and
+# measures how late it woke up. A watchdog thread notices when a wake-up is
+# more than `threshold` overdue and, while the loop is still blocked, takes
+# the loop thread's stack and the request it was handling, so each stall is
+# recorded with its culprit (typically a synchronous tool doing network I/O).
+
+import asyncio
+import heapq
+import itertools
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+
+MAX_STACK_FRAMES = 40
+
+
+def frame_label(code, cache: dict) -> str:
+    label = cache.get(code)
+    if label is None:
+        label = cache[code] = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label
+
+
+def stack_of(frame, cache: dict, limit: int | None = None) -> list[str]:
+    """Returns the labels of a frame and its callers, outermost first."""
+    labels = []
+    while frame is not None:
+        labels.append(frame_label(frame.f_code, cache))
+        frame = frame.f_back
+    labels.reverse()
+    return labels[-limit:] if limit else labels
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads until stopped or `max_seconds` have passed."""
+
+    def __init__(self):
+        self._thread = None
+        self._stop = threading.Event()
+        self._counts = Counter()
+        self._labels = {}
+        self.samples = 0
+        self.interval = 0.0
+        self.started = None
+        self.stopped = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval: float = 0.01, max_seconds: float = 300.0) -> None:
+        if self.running:
+            raise ValueError("The profiler is already running.")
+        if interval <= 0 or max_seconds <= 0:
+            raise ValueError("interval and max_seconds must be positive.")
+        self._counts = Counter()
+        self.samples = 0
+        self.interval = interval
+        self.started, self.stopped = time.time(), None
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval, time.monotonic() + max_seconds),
+                                        name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self, max_stacks: int | None = None) -> dict:
+        """Stops sampling (if it has not stopped by itself) and returns the profile."""
+        if self._thread is None:
+            raise ValueError("The profiler was not started.")
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return self.profile(max_stacks)
+
+    def profile(self, max_stacks: int | None = None) -> dict:
+        stacks = self._counts.most_common(max_stacks)
+        return {
+            "samples": self.samples,
+            "interval_ms": self.interval * 1000,
+            "seconds": round((self.stopped or time.time()) - self.started, 3) if self.started else 0.0,
+            "stacks": len(self._counts),
+            "truncated": len(stacks) < len(self._counts),
+            "collapsed": "".join(f"{stack} {count}\n" for stack, count in stacks),
+        }
+
+    def _run(self, interval: float, deadline: float) -> None:
+        me = threading.get_ident()
+        while not self._stop.wait(interval) and time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = [names.get(ident, f"thread-{ident}")] + stack_of(frame, self._labels)
+                self._counts[";".join(stack)] += 1
+            self.samples += 1
+        self.stopped = time.time()
+
+
+class LoopLagMonitor:
+    """Measures event loop lag and records the request that was running during each stall."""
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, window: int = 1200, keep: int = 10):
+        self.interval = interval
+        self.threshold = threshold
+        self.keep = keep
+        self._lags = deque(maxlen=window)
+        self._recent = deque(maxlen=keep)
+        self._worst = []
+        self._order = itertools.count()
+        self._handlers: dict[str, dict] = {}
+        self._in_flight: dict = {}
+        self._labels = {}
+        self._loop = None
+        self._loop_thread = None
+        self._beat = time.monotonic()
+        self._culprit = None
+        self.checks = 0
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self) -> None:
+        """Starts monitoring the running event loop; later calls do nothing."""
+        if self._loop is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._loop.create_task(self._heartbeat(), name="loop-lag-monitor")
+        threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True).start()
+
+    def track(self, server) -> None:
+        """Wraps the request handlers of a low-level MCP server to know which request is running."""
+        def tracked(handler):
+            async def handle(request):
+                task = asyncio.current_task()
+                if request is None or task is None:
+                    # The server calls its tools/list handler without a request, from inside tools/call
+                    return await handler(request)
+                params = getattr(request, "params", None)
+                subject = getattr(params, "name", None) or getattr(params, "uri", None)
+                outer = self._in_flight.get(task)
+                self._in_flight[task] = f"{request.method} {subject}" if subject else request.method
+                try:
+                    return await handler(request)
+                finally:
+                    if outer is None:
+                        self._in_flight.pop(task, None)
+                    else:
+                        self._in_flight[task] = outer
+            return handle
+
+        for request_type, handler in list(server.request_handlers.items()):
+            server.request_handlers[request_type] = tracked(handler)
+
+    async def _heartbeat(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            self._beat = time.monotonic()
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, loop.time() - expected))
+
+    def _watch(self) -> None:
+        while not self._loop.is_closed():
+            time.sleep(self.threshold / 2)
+            overdue = time.monotonic() - self._beat - self.interval
+            if overdue > self.threshold and self._culprit is None:
+                # The loop is stuck right now: see what it is running
+                frame = sys._current_frames().get(self._loop_thread)
+                task = asyncio.current_task(self._loop)
+                handler = self._in_flight.get(task) or (task.get_name() if task else "event loop callback")
+                self._culprit = (handler, stack_of(frame, self._labels, MAX_STACK_FRAMES) if frame else [])
+
+    def _record(self, lag: float) -> None:
+        self.checks += 1
+        self._lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        culprit, self._culprit = self._culprit, None
+        if lag < self.threshold:
+            return
+        self.stalls += 1
+        handler, stack = culprit or ("unknown (stall ended before it was sampled)", [])
+        stall = {"lag_ms": round(lag * 1000, 1), "at": time.time(), "handler": handler, "stack": stack}
+        self._recent.append(stall)
+        entry = (lag, next(self._order), stall)
+        if len(self._worst) < self.keep:
+            heapq.heappush(self._worst, entry)
+        else:
+            heapq.heappushpop(self._worst, entry)
+        totals = self._handlers.setdefault(handler, {"stalls": 0, "total_lag_ms": 0.0, "max_lag_ms": 0.0})
+        totals["stalls"] += 1
+        totals["total_lag_ms"] = round(totals["total_lag_ms"] + lag * 1000, 1)
+        totals["max_lag_ms"] = max(totals["max_lag_ms"], stall["lag_ms"])
+
+    def metrics(self, include_stacks: bool = True) -> dict:
+        """Lag percentiles and stalls; without `include_stacks` the stalls name only their handler."""
+        lags = sorted(self._lags)
+        pick = lambda p: round(lags[min(len(lags) - 1, int(p * len(lags)))] * 1000, 2) if lags else None
+        strip = (lambda stall: stall) if include_stacks else (lambda stall: {k: v for k, v in stall.items() if k != "stack"})
+        return {
+            "running": self._loop is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "checks": self.checks,
+            "lag_ms": {"p50": pick(0.5), "p99": pick(0.99), "max_recent": pick(1.0), "max": round(self.max_lag * 1000, 2)},
+            "stalls": self.stalls,
+            "by_handler": dict(sorted(self._handlers.items(), key=lambda item: -item[1]["total_lag_ms"])),
+            "worst": [strip(stall) for _, _, stall in sorted(self._worst, reverse=True)],
+            "recent": [strip(stall) for stall in self._recent],
+        }
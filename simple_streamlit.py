@@ -4,11 +4,29 @@ import os
 import subprocess
 import json
 import re
+import shutil
+import tempfile
 from streamlit_ace import st_ace
 
 # Add the current directory to Python path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+# With TRACE_FILE set, each click is traced through main.py down to the server's tools
+from tracing import tracer
+# Commands run as background jobs on a worker pool shared by all sessions
+import command_jobs
+
+# Command history limits: the number of commands kept, the commands shown per
+# page, and the characters of each output kept in the session. Longer outputs
+# are kept in a file and only read when their full text is asked for.
+HISTORY_MAX_ENTRIES = int(os.getenv('HISTORY_MAX_ENTRIES', '200'))
+HISTORY_PAGE_SIZE = int(os.getenv('HISTORY_PAGE_SIZE', '10'))
+HISTORY_PREVIEW_CHARS = int(os.getenv('HISTORY_PREVIEW_CHARS', '4000'))
+
+# Seconds before a running command is killed, and the characters of its partial output shown while it runs
+JOB_TIMEOUT_SECONDS = float(os.getenv('JOB_TIMEOUT_SECONDS', '30'))
+JOB_OUTPUT_TAIL_CHARS = 2000
+
 st.set_page_config(
     page_title="MCP Resource Browser",
     page_icon="🔍",
@@ -36,6 +54,16 @@ if 'text_area_content' not in st.session_state:
     st.session_state.text_area_content = ""
 if 'command_history' not in st.session_state:
     st.session_state.command_history = []
+if 'history_page' not in st.session_state:
+    st.session_state.history_page = 0
+if 'history_next_id' not in st.session_state:
+    st.session_state.history_next_id = 1
+if 'history_full_output' not in st.session_state:
+    st.session_state.history_full_output = None
+if 'jobs' not in st.session_state:
+    st.session_state.jobs = []
+if 'history_dir' not in st.session_state:
+    st.session_state.history_dir = tempfile.mkdtemp(prefix="mcp-history-")
 if 'show_output' not in st.session_state:
     st.session_state.show_output = False
 if 'last_output' not in st.session_state:
@@ -45,6 +73,7 @@ if 'last_command' not in st.session_state:
 if 'selected_resource' not in st.session_state:
     st.session_state.selected_resource = None
 
+@tracer.span("streamlit get_resources")
 def get_resources():
     """Get resources from MCP server using subprocess"""
     try:
@@ -53,7 +82,8 @@ def get_resources():
             [sys.executable, 'main.py', 'help'],
             capture_output=True,
             text=True,
-            timeout=15
+            timeout=15,
+            env=tracer.child_env()
         )
         
         if result.returncode == 0:
@@ -81,7 +111,8 @@ def get_resources():
                     [sys.executable, 'main.py', 'list prompts'],
                     capture_output=True,
                     text=True,
-                    timeout=10
+                    timeout=10,
+                    env=tracer.child_env()
                 )
                 if prompt_result.returncode == 0:
                     prompt_lines = prompt_result.stdout.strip().split('\n')
@@ -100,7 +131,8 @@ def get_resources():
                         [sys.executable, 'main.py', 'list documents'],
                         capture_output=True,
                         text=True,
-                        timeout=10
+                        timeout=10,
+                        env=tracer.child_env()
                     )
                     if doc_result.returncode == 0:
                         doc_lines = doc_result.stdout.strip().split('\n')
@@ -131,25 +163,91 @@ def get_resources():
         st.error(f"Connection error: {str(e)}")
         return False, [], [], []
 
-def execute_command(command):
-    """Execute a command using the MCP server and return formatted result"""
+def submit_command(command):
+    """Start a command as a background job of this session"""
+    job = command_jobs.pool.submit(command, timeout=JOB_TIMEOUT_SECONDS)
+    st.session_state.jobs.append(job)
+    return job
+
+def collect_finished_jobs():
+    """Move the jobs that have finished into the command history; returns True if there were any"""
+    finished = [job for job in st.session_state.jobs if not job.active]
+    for job in finished:
+        add_to_history(job.command, job.result())
+    st.session_state.jobs = [job for job in st.session_state.jobs if job.active]
+    return bool(finished)
+
+@st.fragment(run_every=1.0)
+def show_jobs():
+    """Live status of this session's jobs, refreshed every second without rerunning the whole page"""
+    if collect_finished_jobs():
+        st.rerun(scope="app")
+    for job in st.session_state.jobs:
+        with st.container(border=True):
+            col1, col2 = st.columns([4, 1])
+            with col1:
+                icon = "⏳" if job.status == "queued" else "⚙️"
+                st.markdown(f"{icon} **Job {job.id}** · {job.status} · {job.elapsed:.1f}s — `{job.command}`")
+            with col2:
+                if st.button("Cancel", key=f"cancel_job_{job.id}", use_container_width=True):
+                    job.cancel()
+                    st.rerun(scope="fragment")
+            output = job.output
+            if output:
+                st.code(output[-JOB_OUTPUT_TAIL_CHARS:], language='text')
+
+def add_to_history(command, output):
+    """Adds a command to the history, keeping a preview of long outputs and dropping the oldest entries"""
+    entry_id = st.session_state.history_next_id
+    st.session_state.history_next_id += 1
+    entry = {'id': entry_id, 'command': command, 'output': output, 'length': len(output), 'full_path': None}
+    if len(output) > HISTORY_PREVIEW_CHARS:
+        entry['full_path'] = os.path.join(st.session_state.history_dir, f"{entry_id}.txt")
+        with open(entry['full_path'], 'w', encoding='utf-8') as f:
+            f.write(output)
+        entry['output'] = output[:HISTORY_PREVIEW_CHARS]
+    history = st.session_state.command_history
+    history.append(entry)
+    for dropped in history[:-HISTORY_MAX_ENTRIES]:
+        forget_output(dropped)
+    del history[:-HISTORY_MAX_ENTRIES]
+    st.session_state.history_page = 0
+
+def forget_output(entry):
+    if entry.get('full_path'):
+        try:
+            os.remove(entry['full_path'])
+        except OSError:
+            pass
+
+def read_full_output(entry):
     try:
-        result = subprocess.run(
-            [sys.executable, 'main.py', command],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        output = result.stdout if result.returncode == 0 else f"Error: {result.stderr}"
-        
-        # Format the command and output for inline display
-        formatted_result = f"\n\n--- Command Executed ---\n> {command}\n\n--- Output ---\n{output}\n{'-'*50}\n"
-        
-        return output, formatted_result
-    except Exception as e:
-        error_msg = f"Execution error: {str(e)}"
-        formatted_result = f"\n\n--- Command Executed ---\n> {command}\n\n--- Error ---\n{error_msg}\n{'-'*50}\n"
-        return error_msg, formatted_result
+        with open(entry['full_path'], encoding='utf-8') as f:
+            return f.read()
+    except OSError as e:
+        return f"Full output is no longer available: {e}"
+
+def clear_history():
+    shutil.rmtree(st.session_state.history_dir, ignore_errors=True)
+    st.session_state.history_dir = tempfile.mkdtemp(prefix="mcp-history-")
+    st.session_state.command_history = []
+    st.session_state.history_page = 0
+    st.session_state.history_full_output = None
+
+def show_history_entry(entry, expanded):
+    with st.expander(f"Command {entry['id']}: {entry['command']}", expanded=expanded):
+        if entry['full_path'] and st.session_state.history_full_output == entry['id']:
+            st.code(read_full_output(entry), language='text')
+            if st.button("Show preview only", key=f"history_less_{entry['id']}"):
+                st.session_state.history_full_output = None
+                st.rerun()
+        else:
+            st.code(entry['output'], language='text')
+            if entry['full_path']:
+                st.caption(f"Showing the first {len(entry['output']):,} of {entry['length']:,} characters")
+                if st.button("Show full output", key=f"history_more_{entry['id']}"):
+                    st.session_state.history_full_output = entry['id']
+                    st.rerun()
 
 def get_real_time_suggestions(text):
     """Get real-time autocomplete suggestions based on current text"""
@@ -367,20 +465,14 @@ else:
     with col1:
         if st.button("Execute Command", type="primary", disabled=not st.session_state.current_input.strip()):
             if st.session_state.current_input.strip():
-                with st.spinner("Executing..."):
-                    output, formatted_result = execute_command(st.session_state.current_input.strip())
-                    
-                    # Only add to command history, not to text_area_content
-                    st.session_state.command_history.append({
-                        'command': st.session_state.current_input.strip(),
-                        'output': output
-                    })
-                    
-                    st.session_state.current_input = ""
-                    st.session_state.show_suggestions = False
-                    st.session_state.current_suggestions = []
-                    st.session_state.selected_resource = None
-                    st.rerun()
+                # The command runs in the background; its output lands in the history when it finishes
+                submit_command(st.session_state.current_input.strip())
+                
+                st.session_state.current_input = ""
+                st.session_state.show_suggestions = False
+                st.session_state.current_suggestions = []
+                st.session_state.selected_resource = None
+                st.rerun()
     
     with col2:
         if st.button("Clear Input"):
@@ -393,24 +485,46 @@ else:
     with col3:
         if st.button("Clear History"):
             st.session_state.current_input = ""
-            st.session_state.command_history = []
+            clear_history()
             st.session_state.show_suggestions = False
             st.session_state.current_suggestions = []
             st.session_state.selected_resource = None
             st.rerun()
     
+    # Commands still running, with their partial output
+    collect_finished_jobs()
+    if st.session_state.jobs:
+        st.subheader(f"⚙️ Running Commands ({len(st.session_state.jobs)})")
+        show_jobs()
+    
     # Add command history display section after the execute buttons:
     if st.session_state.command_history:
         st.subheader("📜 Command History")
+        history = st.session_state.command_history
+        pages = (len(history) + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        page = min(st.session_state.history_page, pages - 1)
         
-        # Create a container with scrollable history
+        # Only the current page is rendered, newest first, so reruns cost the same however long the history gets
+        newest = len(history) - page * HISTORY_PAGE_SIZE
+        visible = history[max(0, newest - HISTORY_PAGE_SIZE):newest][::-1]
         with st.container(height=400):
-            for i, entry in enumerate(reversed(st.session_state.command_history)):
-                with st.expander(f"Command {len(st.session_state.command_history) - i}: {entry['command']}", expanded=(i == 0)):
-                    st.code(entry['output'], language='text')
-                
-                if i < len(st.session_state.command_history) - 1:
+            for i, entry in enumerate(visible):
+                show_history_entry(entry, expanded=(page == 0 and i == 0))
+                if i < len(visible) - 1:
                     st.divider()
+        
+        if pages > 1:
+            nav1, nav2, nav3 = st.columns([1, 2, 1])
+            with nav1:
+                if st.button("◀ Newer", disabled=page == 0, use_container_width=True):
+                    st.session_state.history_page = page - 1
+                    st.rerun()
+            with nav2:
+                st.caption(f"Page {page + 1} of {pages} · {len(history)} commands (last {HISTORY_MAX_ENTRIES} kept)")
+            with nav3:
+                if st.button("Older ▶", disabled=page == pages - 1, use_container_width=True):
+                    st.session_state.history_page = page + 1
+                    st.rerun()
     else:
         st.info("No command history yet. Execute a command to see results here.")
 
@@ -441,6 +555,7 @@ st.markdown("""
 
 ### 🎯 Pro Tips:
 - **Inline results**: Output appears immediately after execution
+- **Background commands**: Commands run in the background, so you can start several at once and cancel any of them
 - **Real-time suggestions**: No waiting, instant feedback
 - **Multiple references**: Use multiple @ and / in the same command
 - **Quick actions**: Use buttons for common commands
@@ -0,0 +1,259 @@
+# Request tracing across the client entry points and the server.
+#
+# Set TRACE_FILE to record spans to that file in the Chrome Trace Event
+# format, which https://ui.perfetto.dev and chrome://tracing open directly.
+# Every process appends to the same file, one event per line (the closing
+# "]" of the JSON array is optional in that format), so a Streamlit click,
+# the main.py process it runs, the server that process spawns and the tool
+# calls it makes all end up on one timeline. Without TRACE_FILE spans cost
+# next to nothing.
+#
+# Trace context is propagated W3C style ("00-<trace id>-<span id>-01"):
+#   - to child processes in the TRACEPARENT environment variable, which
+#     becomes the parent of every span the child starts without one
+#   - to the server in the "traceparent" field of each request's _meta,
+#     which TracedClientSession adds and instrument_server reads
+# Both hops are also drawn as flow arrows between the two spans.
+#
+# Spans are complete ("X") events. Viewers need the spans of one thread to
+# nest, so concurrent asyncio tasks are each given their own lane (tid).
+
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+
+import mcp.types as types
+from mcp import ClientSession
+
+TASK_LANE_BASE = 1_000_000_000
+
+_current = contextvars.ContextVar("trace_span", default=None)
+
+
+def parse_traceparent(value: str | None) -> tuple[str, str] | None:
+    """Returns (trace_id, span_id) from a traceparent value, or None if it is missing or malformed."""
+    parts = (value or "").strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+class Span:
+    __slots__ = ("name", "category", "trace_id", "span_id", "parent_id", "args", "started", "remote")
+
+    def __init__(self, name: str, category: str, parent: tuple[str, str] | None, args: dict, remote: bool = False):
+        self.name = name
+        self.category = category
+        self.trace_id = parent[0] if parent else f"{random.getrandbits(128):032x}"
+        self.parent_id = parent[1] if parent else None
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.args = args
+        self.started = time.time_ns()
+        self.remote = remote
+
+    @property
+    def context(self) -> tuple[str, str]:
+        return self.trace_id, self.span_id
+
+    def set(self, **args) -> None:
+        self.args.update(args)
+
+
+class _NoSpan:
+    """Stands in for a span while tracing is off, so callers never need to check."""
+
+    def set(self, **args) -> None:
+        pass
+
+
+NO_SPAN = _NoSpan()
+
+
+class Tracer:
+    """Records spans to a Chrome Trace Event file shared by all traced processes."""
+
+    def __init__(self, path: str | None = None, parent: str | None = None):
+        self.path = os.path.abspath(path) if path else None
+        # Parent of spans started without one, handed down by the parent process
+        self.process_parent = parse_traceparent(parent)
+        self.process_name = os.path.basename(sys.argv[0]) if sys.argv and sys.argv[0] else "python"
+        self._fd = None
+        self._lock = threading.Lock()
+        self._lanes = weakref.WeakKeyDictionary()
+        self._lane_ids = itertools.count(TASK_LANE_BASE)
+        self._named_lanes = set()
+
+    @classmethod
+    def from_env(cls) -> "Tracer":
+        return cls(os.getenv("TRACE_FILE"), os.getenv("TRACEPARENT"))
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    @contextmanager
+    def span(self, name: str, /, category: str = "mcp", parent: str | None = None, **args):
+        """Times the enclosed block as a child of the current span.
+
+        `parent` is a traceparent value received from another process; it
+        takes the place of the current span as the parent.
+        """
+        if not self.enabled:
+            yield NO_SPAN
+            return
+        remote = parse_traceparent(parent)
+        current = _current.get()
+        span = Span(name, category, remote or (current.context if current else self.process_parent), args,
+                    remote=remote is not None)
+        token = _current.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.args["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current.reset(token)
+            self._finish(span, time.time_ns())
+
+    def record(self, name: str, started: float, /, category: str = "mcp", parent: str | None = None, **args) -> None:
+        """Records a span that started at `started` (a time.time() value) and ends now."""
+        if not self.enabled:
+            return
+        remote = parse_traceparent(parent)
+        current = _current.get()
+        span = Span(name, category, remote or (current.context if current else self.process_parent), args,
+                    remote=remote is not None)
+        span.started = int(started * 1e9)
+        self._finish(span, time.time_ns())
+
+    def traceparent(self) -> str | None:
+        """Returns the traceparent to send along with a request made in the current span.
+
+        Also starts a flow arrow, which ends at the span the receiver starts with it.
+        """
+        current = _current.get() if self.enabled else None
+        if current is None:
+            return None
+        self._write({"name": "traceparent", "cat": "flow", "ph": "s", "id": current.span_id,
+                     "ts": time.time_ns() // 1000, "pid": os.getpid(), "tid": self._lane()})
+        return f"00-{current.trace_id}-{current.span_id}-01"
+
+    def child_env(self, env: dict | None = None) -> dict | None:
+        """Returns the environment for a child process, carrying TRACE_FILE and the current span.
+
+        `env` defaults to this process's environment. Unchanged while tracing is off.
+        """
+        if not self.enabled:
+            return env
+        env = dict(os.environ if env is None else env, TRACE_FILE=self.path)
+        traceparent = self.traceparent()
+        if traceparent:
+            env["TRACEPARENT"] = traceparent
+        return env
+
+    def _lane(self) -> int:
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        if task is None:
+            lane, lane_name = threading.get_native_id(), threading.current_thread().name
+        else:
+            lane = self._lanes.get(task)
+            if lane is None:
+                lane = self._lanes[task] = next(self._lane_ids)
+            lane_name = task.get_name()
+        if lane not in self._named_lanes:
+            self._named_lanes.add(lane)
+            self._write({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": lane, "args": {"name": lane_name}})
+        return lane
+
+    def _finish(self, span: Span, ended: int) -> None:
+        lane = self._lane()
+        args = {"trace_id": span.trace_id, "span_id": span.span_id, **span.args}
+        if span.parent_id:
+            args["parent_id"] = span.parent_id
+        if span.remote:
+            self._write({"name": "traceparent", "cat": "flow", "ph": "f", "bp": "e", "id": span.parent_id,
+                         "ts": span.started // 1000, "pid": os.getpid(), "tid": lane})
+        self._write({"name": span.name, "cat": span.category, "ph": "X", "ts": span.started // 1000,
+                     "dur": max(0, ended - span.started) // 1000, "pid": os.getpid(), "tid": lane, "args": args})
+
+    def _write(self, event: dict) -> None:
+        line = (json.dumps(event, default=str) + ",\n").encode("utf-8")
+        with self._lock:
+            if self._fd is None:
+                self._open()
+            # One append per event, so events of concurrent processes do not interleave
+            os.write(self._fd, line)
+
+    def _open(self) -> None:
+        try:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+            os.write(self._fd, b"[\n")
+        except FileExistsError:
+            self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        os.write(self._fd, (json.dumps({"name": "process_name", "ph": "M", "pid": os.getpid(),
+                                        "args": {"name": self.process_name}}) + ",\n").encode("utf-8"))
+
+
+tracer = Tracer.from_env()
+
+
+def describe_request(request) -> dict:
+    """Span arguments naming what a request is about: the tool, prompt or resource uri."""
+    params = getattr(request, "params", None)
+    if getattr(params, "uri", None) is not None:
+        return {"uri": str(params.uri)}
+    if getattr(params, "name", None) is not None:
+        # "tools/call" -> tool, "prompts/get" -> prompt
+        return {request.method.split("/")[0].rstrip("s"): params.name}
+    return {}
+
+
+class TracedClientSession(ClientSession):
+    """ClientSession that times every request and sends the trace context in its _meta."""
+
+    async def send_request(self, request, result_type, *args, **kwargs):
+        root = request.root
+        with tracer.span(f"client {root.method}", **describe_request(root)):
+            traceparent = tracer.traceparent()
+            if traceparent and hasattr(root, "params"):
+                if root.params is None:
+                    # The list requests have no params unless they page
+                    root.params = types.PaginatedRequestParams()
+                if root.params.meta is None:
+                    root.params.meta = types.RequestParams.Meta()
+                root.params.meta.traceparent = traceparent
+            return await super().send_request(request, result_type, *args, **kwargs)
+
+
+def instrument_server(server) -> None:
+    """Wraps the request handlers of a low-level MCP server so each request is a span.
+
+    The span continues the trace from the request's _meta when the client sent one.
+    """
+    def traced(handler):
+        async def handle(request):
+            if request is None:
+                # The server calls its tools/list handler without a request to fill its tool cache
+                return await handler(request)
+            meta = getattr(getattr(request, "params", None), "meta", None)
+            with tracer.span(f"server {request.method}", parent=getattr(meta, "traceparent", None),
+                             **describe_request(request)) as span:
+                result = await handler(request)
+                if getattr(result.root, "isError", False):
+                    span.set(is_error=True)
+                return result
+        return handle
+
+    for request_type, handler in list(server.request_handlers.items()):
+        server.request_handlers[request_type] = traced(handler)
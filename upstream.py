@@ -0,0 +1,361 @@
+# Protection for the external APIs the tools call (weatherapi.com,
+# exchangerate-api.com and Yahoo Finance).
+#
+# Each upstream gets an AdmissionController: a token bucket limits the request
+# rate, callers that have to wait for a token queue up to a bounded depth and
+# wait time, and anything beyond that fails immediately with OverloadedError
+# instead of piling up and turning into upstream 429s.
+#
+# Upstream wraps the controller with the rest of the call policy: a deadline
+# per tool call, bounded retries with jittered exponential backoff, a circuit
+# breaker that fails fast while the upstream is down, and a response cache
+# that answers repeated calls and is served stale when the upstream fails.
+
+import asyncio
+import contextvars
+import functools
+import math
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+
+from tracing import tracer
+from upstream_replay import MISS_HEADER
+
+
+class OverloadedError(Exception):
+    """Raised when an upstream's wait queue is full or the wait would be too long."""
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after all retries, or fails transiently."""
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling the upstream while its circuit breaker is open."""
+
+
+# Failures worth retrying and counting against the breaker. Anything else, e.g.
+# a bug in the fetch function, is raised to the caller right away.
+TRANSIENT_ERRORS = (UpstreamError, requests.ConnectionError, requests.Timeout)
+
+
+def check_response(response) -> None:
+    """Raises UpstreamError for responses worth retrying (429 and 5xx).
+
+    A request the replay stand-in has no recorded response for raises
+    ValueError, so the miss is neither retried nor cached.
+    """
+    if response.headers.get(MISS_HEADER):
+        # Only the path: the query can carry an API key
+        raise ValueError(f"No recorded response for {urlsplit(response.url).path}. Record it with UPSTREAM_MODE=record.")
+    if response.status_code == 429 or response.status_code >= 500:
+        raise UpstreamError(f"{response.url} returned HTTP {response.status_code}")
+
+
+def _env(prefix: str, name: str, default, cast=float):
+    return cast(os.getenv(f"{prefix}_{name}", default))
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations for future tokens.
+
+    Reserving while the bucket is empty drives the token count negative; the
+    returned delay is how long the caller must wait for its token.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float | None = None) -> float | None:
+        """Reserves one token and returns the wait, or None if it would exceed `max_wait`."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            wait = max(0.0, (1 - self.tokens) / self.rate)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self.tokens -= 1
+            return wait
+
+
+class AdmissionController:
+    """Rate limit plus bounded wait queue in front of one upstream."""
+
+    def __init__(self, name: str, rate: float, burst: float, max_queue: int, max_wait: float):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.queue_depth = 0
+        self.max_queue_depth = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.waits = deque(maxlen=1024)
+
+    @classmethod
+    def from_env(cls, name: str, rate: float = 5.0, burst: float = 10.0, max_queue: int = 100,
+                 max_wait: float = 2.0) -> "AdmissionController":
+        """Builds a controller, letting e.g. WEATHERAPI_RATE override the defaults."""
+        prefix = name.upper()
+        return cls(
+            name,
+            rate=_env(prefix, "RATE", rate),
+            burst=_env(prefix, "BURST", burst),
+            max_queue=_env(prefix, "MAX_QUEUE", max_queue, int),
+            max_wait=_env(prefix, "MAX_WAIT", max_wait),
+        )
+
+    async def acquire(self) -> float:
+        """Waits for permission to call the upstream and returns the time waited."""
+        if self.queue_depth >= self.max_queue:
+            self.rejected += 1
+            raise OverloadedError(f"{self.name} is overloaded: {self.queue_depth} requests already queued.")
+        wait = self.bucket.reserve(self.max_wait)
+        if wait is None:
+            self.rejected += 1
+            raise OverloadedError(f"{self.name} is overloaded: queue wait would exceed {self.max_wait}s.")
+        if wait > 0:
+            self.queue_depth += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+            try:
+                await asyncio.sleep(wait)
+            finally:
+                self.queue_depth -= 1
+        self.admitted += 1
+        self.waits.append(wait)
+        return wait
+
+    def metrics(self) -> dict:
+        waits = sorted(self.waits)
+
+        def percentile(p):
+            return waits[min(len(waits) - 1, int(p * len(waits)))] if waits else 0.0
+
+        return {
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                "mean": sum(waits) / len(waits) if waits else 0.0,
+                "p50": percentile(0.50),
+                "p99": percentile(0.99),
+                "max": waits[-1] if waits else 0.0,
+            },
+        }
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after a cool-down."""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._probing = False
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+        if self.state == "half_open" and not self._probing:
+            self._probing = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self._probing = False
+
+    def cancel_probe(self) -> None:
+        """Releases a half-open probe that ended without reaching the upstream."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probing = False
+        if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+            if self.state != "open":
+                self.times_opened += 1
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def metrics(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "short_circuited": self.short_circuited,
+        }
+
+
+class Upstream:
+    """Call policy for one external API: admission, deadline, retries, breaker and cache."""
+
+    def __init__(self, name: str, admission: AdmissionController, deadline: float = 5.0, retries: int = 2,
+                 backoff: float = 0.2, max_backoff: float = 2.0, breaker: CircuitBreaker | None = None,
+                 cache_ttl: float = 60.0, max_stale: float = 24 * 3600.0, max_cache_entries: int = 1024,
+                 transient_errors: tuple = TRANSIENT_ERRORS):
+        self.name = name
+        self.admission = admission
+        self.deadline = deadline
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.cache_ttl = cache_ttl
+        self.max_stale = max_stale
+        self.max_cache_entries = max_cache_entries
+        self.transient_errors = transient_errors
+        # Fetches run on threads of their own, sized to what admission lets through within one
+        # deadline, so a slow upstream cannot take the threads of the other upstreams
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, math.ceil(admission.bucket.burst + admission.bucket.rate * deadline)),
+            thread_name_prefix=f"upstream-{name}",
+        )
+        self.cache: dict = {}
+        self.cache_hits = 0
+        self.stale_served = 0
+        self.timeouts = 0
+        self.retried = 0
+        self.failures = 0
+
+    @classmethod
+    def from_env(cls, name: str, rate: float = 5.0, burst: float = 10.0, cache_ttl: float = 60.0,
+                 transient_errors: tuple = TRANSIENT_ERRORS) -> "Upstream":
+        """Builds an upstream, letting e.g. WEATHERAPI_DEADLINE override the defaults."""
+        prefix = name.upper()
+        return cls(
+            name,
+            AdmissionController.from_env(name, rate=rate, burst=burst),
+            deadline=_env(prefix, "DEADLINE", 5.0),
+            retries=_env(prefix, "RETRIES", 2, int),
+            breaker=CircuitBreaker(
+                failure_threshold=_env(prefix, "BREAKER_FAILURES", 5, int),
+                reset_timeout=_env(prefix, "BREAKER_RESET", 30.0),
+            ),
+            cache_ttl=_env(prefix, "CACHE_TTL", cache_ttl),
+            max_stale=_env(prefix, "CACHE_MAX_STALE", 24 * 3600.0),
+            transient_errors=transient_errors,
+        )
+
+    def cached(self, key, max_age: float):
+        entry = self.cache.get(key)
+        if entry is not None and time.monotonic() - entry[1] <= max_age:
+            return entry
+        return None
+
+    def _stale(self, key, error: Exception):
+        entry = self.cached(key, self.max_stale)
+        if entry is None:
+            raise error
+        self.stale_served += 1
+        value, stored_at = entry
+        if isinstance(value, dict):
+            value = dict(value, stale=True, cached_age_seconds=round(time.monotonic() - stored_at, 1))
+        return value
+
+    async def call(self, key, fetch, *args):
+        """Returns `fetch(*args, timeout=...)`, cached under `key`.
+
+        `fetch` is a blocking function and runs on the upstream's threads. It
+        must be idempotent because attempts failing with a transient error are
+        retried; other errors are raised at once.
+        """
+        with tracer.span(f"upstream {self.name}", key=str(key)) as span:
+            entry = self.cached(key, self.cache_ttl)
+            if entry is not None:
+                self.cache_hits += 1
+                span.set(cache="hit")
+                return entry[0]
+            if not self.breaker.allow():
+                span.set(breaker="open")
+                return self._stale(key, CircuitOpenError(f"{self.name} is unavailable (circuit open)."))
+            return await self._call(key, fetch, *args)
+
+    async def _call(self, key, fetch, *args):
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        error = None
+        settled = False
+        try:
+            for attempt in range(self.retries + 1):
+                with tracer.span("admission"):
+                    await self.admission.acquire()
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    with tracer.span("attempt", attempt=attempt + 1):
+                        # Copy the context like asyncio.to_thread, so spans in `fetch` nest under this one
+                        call = functools.partial(contextvars.copy_context().run, fetch, *args, timeout=remaining)
+                        value = await asyncio.wait_for(loop.run_in_executor(self.executor, call), remaining)
+                except asyncio.TimeoutError:
+                    self.timeouts += 1
+                    error = UpstreamError(f"{self.name} did not answer within {self.deadline}s.")
+                except self.transient_errors as e:
+                    error = e
+                else:
+                    self.breaker.record_success()
+                    settled = True
+                    # An error answer must not replace a good one in the cache
+                    if not (isinstance(value, dict) and "error" in value):
+                        self.store(key, value)
+                    return value
+
+                self.breaker.record_failure()
+                settled = True
+                if attempt == self.retries or self.breaker.state == "open":
+                    break
+                # Full jitter: sleep a random fraction of the exponential backoff
+                delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+                if loop.time() + delay >= deadline:
+                    break
+                self.retried += 1
+                await asyncio.sleep(delay)
+        finally:
+            if not settled:
+                # Rejected by admission control or cancelled before any answer
+                self.breaker.cancel_probe()
+
+        self.failures += 1
+        if error is None:
+            error = UpstreamError(f"{self.name} did not answer within {self.deadline}s.")
+        return self._stale(key, error)
+
+    def store(self, key, value) -> None:
+        """Caches a response, dropping the oldest entry when the cache is full."""
+        self.cache.pop(key, None)
+        self.cache[key] = (value, time.monotonic())
+        if len(self.cache) > self.max_cache_entries:
+            del self.cache[next(iter(self.cache))]
+
+    def metrics(self) -> dict:
+        return {
+            "admission": self.admission.metrics(),
+            "breaker": self.breaker.metrics(),
+            "cache": {"entries": len(self.cache), "hits": self.cache_hits, "stale_served": self.stale_served},
+            "timeouts": self.timeouts,
+            "retries": self.retried,
+            "failures": self.failures,
+        }
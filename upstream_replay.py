@@ -0,0 +1,217 @@
+# Record/replay stand-in for the external APIs, for offline tests and benchmarks.
+#
+# UPSTREAM_MODE selects how the network tools reach their upstreams:
+#   live    - call the real APIs (default)
+#   record  - call the real APIs and save every response to UPSTREAM_FIXTURES
+#   replay  - serve the recorded responses from a local HTTP stand-in
+#
+# In replay mode REPLAY_LATENCY ("0.05" or a "0.02-0.2" range, in seconds) and
+# REPLAY_ERROR_RATE (0 to 1, answered with HTTP 503) inject latency and errors.
+# The stand-in runs inside the server process, started when the server starts or
+# a tool first needs it (never on import, so worker processes that import the
+# server module do not start one), unless REPLAY_URL points at one started on
+# its own:
+#   python upstream_replay.py --fixtures fixtures/upstreams.json --port 8765
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+DEFAULT_FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "upstreams.json")
+
+# Query parameters that carry credentials and are never written to fixtures
+SECRET_PARAMS = {"key", "apikey", "api_key", "token"}
+
+# Set on the 404 answered for a request without a recorded response, so it is
+# not mistaken for a recorded 404
+MISS_HEADER = "X-Replay-Miss"
+
+
+def fixture_key(path: str) -> str:
+    """Normalizes a request path and query into the key responses are stored under."""
+    parts = urlsplit(path)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in SECRET_PARAMS]
+    key = parts.path or "/"
+    if query:
+        key += "?" + urlencode(sorted(query))
+    return key
+
+
+def parse_latency(value: str | None) -> tuple[float, float]:
+    if not value:
+        return 0.0, 0.0
+    low, _, high = value.partition("-")
+    return float(low), float(high or low)
+
+
+class FixtureStore:
+    """Recorded responses by upstream name and fixture key, kept in one JSON file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.responses = json.load(f)
+        except FileNotFoundError:
+            self.responses = {}
+
+    def get(self, upstream: str, key: str) -> dict | None:
+        return self.responses.get(upstream, {}).get(key)
+
+    def put(self, upstream: str, key: str, status: int, body) -> None:
+        with self._lock:
+            self.responses.setdefault(upstream, {})[key] = {"status": status, "body": body}
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.responses, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+
+
+class ReplayServer:
+    """Local HTTP stand-in serving recorded responses at /<upstream>/<path>."""
+
+    def __init__(self, fixtures: FixtureStore, latency: tuple[float, float] = (0.0, 0.0),
+                 error_rate: float = 0.0, port: int = 0):
+        self.fixtures = fixtures
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self.injected_errors = 0
+        self.misses = 0
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def start(self) -> "ReplayServer":
+        threading.Thread(target=self.httpd.serve_forever, name="upstream-replay", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests += 1
+                time.sleep(random.uniform(*server.latency))
+                upstream, _, rest = self.path.lstrip("/").partition("/")
+                if random.random() < server.error_rate:
+                    server.injected_errors += 1
+                    self._send(503, {"error": "injected upstream error"})
+                    return
+                recorded = server.fixtures.get(upstream, fixture_key("/" + rest))
+                if recorded is None:
+                    server.misses += 1
+                    self._send(404, {"error": f"no recorded response for {self.path}"}, {MISS_HEADER: "1"})
+                    return
+                self._send(recorded["status"], recorded["body"])
+
+            def _send(self, status: int, body, headers: dict | None = None) -> None:
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+class UpstreamReplay:
+    """Routes the network tools to live, recording or replayed upstreams."""
+
+    def __init__(self, mode: str = "live", fixtures_path: str = DEFAULT_FIXTURES,
+                 latency: tuple[float, float] = (0.0, 0.0), error_rate: float = 0.0, port: int = 0,
+                 replay_url: str | None = None):
+        if mode not in ("live", "record", "replay"):
+            raise ValueError(f"Unknown UPSTREAM_MODE {mode!r}, expected live, record or replay.")
+        self.mode = mode
+        self.fixtures = FixtureStore(fixtures_path) if mode != "live" else None
+        self.latency = latency
+        self.error_rate = error_rate
+        self.port = port
+        self.server = None
+        self.replay_url = replay_url
+        self._live_urls = {}
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Starts the in-process stand-in when replaying without REPLAY_URL; later calls do nothing."""
+        with self._lock:
+            if self.replaying and not self.replay_url:
+                self.server = ReplayServer(self.fixtures, self.latency, self.error_rate, self.port).start()
+                self.replay_url = self.server.url
+
+    @classmethod
+    def from_env(cls) -> "UpstreamReplay":
+        return cls(
+            mode=os.getenv("UPSTREAM_MODE", "live"),
+            fixtures_path=os.getenv("UPSTREAM_FIXTURES", DEFAULT_FIXTURES),
+            latency=parse_latency(os.getenv("REPLAY_LATENCY")),
+            error_rate=float(os.getenv("REPLAY_ERROR_RATE", "0")),
+            port=int(os.getenv("REPLAY_PORT", "0")),
+            replay_url=os.getenv("REPLAY_URL"),
+        )
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def base_url(self, upstream: str, live_url: str = "") -> str:
+        """Returns the base URL the tools should use for an upstream."""
+        self._live_urls[upstream] = live_url.rstrip("/")
+        if self.replaying:
+            self.start()
+            return f"{self.replay_url.rstrip('/')}/{upstream}"
+        return live_url
+
+    def record(self, upstream: str, key: str, status: int, body) -> None:
+        """Saves a live response when recording."""
+        if self.mode == "record":
+            self.fixtures.put(upstream, fixture_key(key), status, body)
+
+    def record_response(self, upstream: str, response, body) -> None:
+        """Saves a live `requests` response, keyed by its URL relative to the upstream's base URL."""
+        if self.mode == "record":
+            url = response.url
+            live_url = self._live_urls.get(upstream, "")
+            path = url[len(live_url):] if live_url and url.startswith(live_url) else urlsplit(url).path
+            self.record(upstream, path, response.status_code, body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recorded upstream responses over HTTP.")
+    parser.add_argument("--fixtures", default=os.getenv("UPSTREAM_FIXTURES", DEFAULT_FIXTURES))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default=os.getenv("REPLAY_LATENCY"), help='seconds, e.g. "0.05" or "0.02-0.2"')
+    parser.add_argument("--error-rate", type=float, default=float(os.getenv("REPLAY_ERROR_RATE", "0")))
+    args = parser.parse_args()
+
+    server = ReplayServer(FixtureStore(args.fixtures), parse_latency(args.latency), args.error_rate, args.port)
+    print(f"Replaying {args.fixtures} at {server.url}/<upstream>/...")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
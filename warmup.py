@@ -0,0 +1,101 @@
+# Startup warm-up: prefetch the upstream caches and preload hot documents.
+#
+# Document reads are counted in AccessStats and saved to disk, so the next
+# run knows which documents were hottest. WarmUp runs a list of named steps
+# in the background after the server starts and reports its progress for the
+# readiness resource; a failed step is recorded and does not stop the others.
+
+import asyncio
+import json
+import os
+import threading
+import time
+
+
+class AccessStats:
+    """Read counts per document, persisted across runs in a JSON file.
+
+    Counts from earlier runs are multiplied by `decay` when loaded, so
+    documents that stop being read gradually drop out of the hot set.
+    """
+
+    def __init__(self, path: str, decay: float = 0.5):
+        self.path = path
+        self.counts: dict[str, float] = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding="utf-8") as f:
+                self.counts = {name: count * decay for name, count in json.load(f).items() if count * decay >= 0.5}
+        except (FileNotFoundError, ValueError):
+            pass
+
+    def record(self, document_name: str) -> None:
+        with self._lock:
+            self.counts[document_name] = self.counts.get(document_name, 0) + 1
+
+    def hottest(self, limit: int) -> list[str]:
+        """Returns up to `limit` document names, most read first."""
+        with self._lock:
+            return sorted(self.counts, key=self.counts.get, reverse=True)[:limit]
+
+    def save(self) -> None:
+        with self._lock:
+            counts = dict(self.counts)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(counts, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class WarmUp:
+    """Runs named warm-up steps in the background and tracks their progress."""
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.steps: list[tuple[str, object]] = []
+        self.results: dict[str, dict] = {}
+        self.state = "pending" if enabled else "disabled"
+        self.started_at = None
+        self.finished_at = None
+        self.task = None
+
+    def add(self, name: str, step) -> None:
+        """Adds a step; `step` is a coroutine function taking no arguments."""
+        self.steps.append((name, step))
+
+    def start(self, concurrency: int = 4) -> None:
+        """Starts the steps on the running event loop unless already started."""
+        if self.task is None and self.enabled:
+            self.task = asyncio.get_running_loop().create_task(self.run(concurrency))
+
+    async def run(self, concurrency: int = 4) -> None:
+        self.state = "running"
+        self.started_at = time.time()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run_step(name, step):
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await step()
+                except Exception as e:
+                    self.results[name] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+                else:
+                    self.results[name] = {"ok": True}
+                self.results[name]["seconds"] = round(time.perf_counter() - started, 3)
+
+        await asyncio.gather(*(run_step(name, step) for name, step in self.steps))
+        self.state = "done"
+        self.finished_at = time.time()
+
+    def progress(self) -> dict:
+        failed = [name for name, result in self.results.items() if not result["ok"]]
+        return {
+            "state": self.state,
+            "ready": self.state in ("done", "disabled"),
+            "steps": len(self.steps),
+            "completed": len(self.results),
+            "failed": failed,
+            "elapsed_seconds": round((self.finished_at or time.time()) - self.started_at, 3) if self.started_at else 0.0,
+            "results": self.results,
+        }
@@ -0,0 +1,224 @@
+# Multi-process worker mode for CPU-bound tool work.
+#
+# With SERVER_WORKERS=N the server process still speaks the protocol and owns
+# the documents, but CPU-bound work on documents (parsing numbers for
+# compute_numbers, regular expression search) runs in N worker processes, so
+# it scales across cores while the event loop stays free.
+#
+# Documents are sharded by a stable hash of their name: all work on a
+# document goes to the same worker, which keeps the texts it has been sent
+# (up to WORKER_CACHE_BYTES, least recently used first out). Each text is
+# tagged with a generation that the server bumps whenever the document
+# changes, so a text crosses the process boundary once per change and worker;
+# calls after that send only the name and generation.
+#
+# The functions the workers run live in modules without import side effects
+# (bulk_math, document_grep and this one). The fork server still imports the
+# server's main module once, so that module must not start servers, threads
+# or processes on import; it does so from its lifespan or on first use.
+
+import asyncio
+import itertools
+import multiprocessing
+import threading
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+
+class StaleDocuments(Exception):
+    """Raised in a worker for documents it does not hold at the requested generation."""
+
+    def __init__(self, names: list[str]):
+        super().__init__(names)
+        self.names = names
+
+
+# Worker process state: document name -> (generation, text), least recently used first
+_texts = OrderedDict()
+_text_bytes = 0
+_cache_bytes = 0
+
+
+def _init_worker(cache_bytes: int) -> None:
+    global _cache_bytes
+    _cache_bytes = cache_bytes
+
+
+def _resolve(documents: list[tuple[str, int, str | None]]) -> list[tuple[str, str]]:
+    """Turns (name, generation, text or None) into (name, text), from the cache where no text was sent."""
+    global _text_bytes
+    resolved, stale = [], []
+    for name, generation, text in documents:
+        if text is None:
+            cached = _texts.get(name)
+            if cached is None or cached[0] != generation:
+                stale.append(name)
+                continue
+            _texts.move_to_end(name)
+            text = cached[1]
+        else:
+            previous = _texts.pop(name, None)
+            if previous is not None:
+                _text_bytes -= len(previous[1])
+            _texts[name] = (generation, text)
+            _text_bytes += len(text)
+        resolved.append((name, text))
+    if stale:
+        raise StaleDocuments(stale)
+    while _text_bytes > _cache_bytes and _texts:
+        _, (_, text) = _texts.popitem(last=False)
+        _text_bytes -= len(text)
+    return resolved
+
+
+def _call(fn, args):
+    return fn(*args)
+
+
+def _call_with_document(document: tuple[str, int, str | None], fn, args):
+    return fn(_resolve([document])[0][1], *args)
+
+
+def _call_with_documents(documents: list[tuple[str, int, str | None]], fn, args):
+    return fn(_resolve(documents), *args)
+
+
+class ShardedWorkers:
+    """N single-process worker shards, each holding the texts of the documents hashed to it."""
+
+    def __init__(self, workers: int, cache_bytes: int = 256 * 1024 * 1024):
+        if workers < 1:
+            raise ValueError("workers must be at least 1.")
+        self.workers = workers
+        self.cache_bytes = cache_bytes
+        self._pools = [None] * workers
+        # Per shard: document name -> generation of the text the worker was sent
+        self._sent = [{} for _ in range(workers)]
+        self._generations = {}
+        self._counter = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def shard(self, document_name: str) -> int:
+        return zlib.crc32(document_name.encode("utf-8", "surrogatepass")) % self.workers
+
+    def changed(self, document_name: str, previous: str | None, text: str, version: int) -> None:
+        """Document store listener: later calls send the new text along."""
+        self._generations[document_name] = next(self._counter)
+
+    def _executor(self, shard: int) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pools[shard] is None:
+                # Forked workers can deadlock on locks held by the server's threads, as in document_grep
+                self._pools[shard] = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=multiprocessing.get_context("forkserver"),
+                    initializer=_init_worker,
+                    initargs=(self.cache_bytes,),
+                )
+            return self._pools[shard]
+
+    async def _submit(self, shard: int, fn, *args):
+        try:
+            return await asyncio.wrap_future(self._executor(shard).submit(fn, *args))
+        except BrokenProcessPool:
+            with self._lock:
+                self._pools[shard] = None
+            self._sent[shard].clear()
+            raise ValueError(f"Worker process {shard} exited unexpectedly; it is restarted on the next call.")
+
+    async def start(self) -> None:
+        """Starts all worker processes, so the first calls do not wait for them."""
+        await asyncio.gather(*(self._submit(shard, _call, int, ()) for shard in range(self.workers)))
+
+    def close(self) -> None:
+        for pool in self._pools:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        self._pools = [None] * self.workers
+        for sent in self._sent:
+            sent.clear()
+
+    def _documents(self, shard: int, names, read, resend: bool, max_bytes: int | None = None) -> list[tuple[str, int, str | None]]:
+        """Takes names from `names` until the texts that have to be sent reach `max_bytes`."""
+        sent = self._sent[shard]
+        documents, size = [], 0
+        for name in names:
+            # Read the generation before the text: a change in between only causes a resend
+            generation = self._generations.get(name, 0)
+            text = None if not resend and sent.get(name) == generation else read(name)
+            documents.append((name, generation, text))
+            size += len(text) if text is not None else 0
+            if max_bytes is not None and size >= max_bytes:
+                break
+        return documents
+
+    async def _run_on(self, shard: int, names: list[str], read, fn, args, single: bool = False, documents=None):
+        for resend in (False, True):
+            if documents is None:
+                if single:
+                    documents = self._documents(shard, names, read, resend)
+                else:
+                    # Reading many texts can mean decompressing or extracting them
+                    documents = await asyncio.to_thread(self._documents, shard, names, read, resend)
+            try:
+                if single:
+                    result = await self._submit(shard, _call_with_document, documents[0], fn, args)
+                else:
+                    result = await self._submit(shard, _call_with_documents, documents, fn, args)
+            except StaleDocuments as e:
+                # The worker dropped them from its cache; send every text on the second try
+                for name in e.names:
+                    self._sent[shard].pop(name, None)
+                documents = None
+                continue
+            for name, generation, _ in documents:
+                self._sent[shard][name] = generation
+            return result
+
+    async def run_on_document(self, document_name: str, read, fn, *args):
+        """Runs fn(text, *args) on the worker of the document; `read(name)` gives the text when the worker needs it."""
+        return await self._run_on(self.shard(document_name), [document_name], read, fn, args, single=True)
+
+    async def map_documents(self, names: list[str], read, fn, *args, batch_bytes: int = 16 * 1024 * 1024):
+        """Runs fn([(name, text), ...], *args) on each worker for its share of the documents.
+
+        Each worker's share goes in batches of about `batch_bytes` of texts it
+        does not hold yet, one batch per worker at a time, so the texts read
+        stay bounded. Yields (documents_done, result) as the batches finish.
+        """
+        shards = {}
+        for name in names:
+            shards.setdefault(self.shard(name), []).append(name)
+        results = asyncio.Queue()
+
+        async def run_shard(shard: int, shard_names: list[str]):
+            remaining = iter(shard_names)
+            try:
+                while True:
+                    documents = await asyncio.to_thread(self._documents, shard, remaining, read, False, batch_bytes)
+                    if not documents:
+                        break
+                    batch = [name for name, _, _ in documents]
+                    results.put_nowait((len(batch), await self._run_on(shard, batch, read, fn, args, documents=documents), None))
+            except Exception as e:
+                results.put_nowait((0, None, e))
+            results.put_nowait(None)
+
+        tasks = [asyncio.ensure_future(run_shard(shard, shard_names)) for shard, shard_names in shards.items()]
+        done, running = 0, len(tasks)
+        try:
+            while running:
+                item = await results.get()
+                if item is None:
+                    running -= 1
+                    continue
+                size, result, error = item
+                if error is not None:
+                    raise error
+                done += size
+                yield done, result
+        finally:
+            for task in tasks:
+                task.cancel()